@@ -0,0 +1,153 @@
+#  ########################################################################
+#
+#   SweetHome3D XML/OBJ export archive access
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Home.xml is parsed straight out of the ZIP and only the entries the home
+# really references (structure, models with their MTL and textures, images)
+# are copied to the scratch directory, in bounded chunks, when first needed.
+# This module does not depend on bpy.
+
+from zipfile import ZipFile
+from xml.etree import ElementTree
+from urllib.parse import unquote
+
+import os
+import posixpath
+import shutil
+
+# bytes copied per read when extracting an entry
+chunk_size = 1024 * 1024
+
+
+def entryName(reference):
+  """Convert a Home.xml or OBJ/MTL reference to a normalized ZIP entry name."""
+  name = unquote(reference).replace('\\', '/')
+  name = posixpath.normpath(name)
+  while name.startswith('./'):
+    name = name[2:]
+  return name.lstrip('/')
+
+
+class HomeArchive(object):
+  """Read-only view of an export ZIP that extracts entries on demand."""
+
+  def __init__(self, zip_path, scratch_dir):
+    self.zip_path = os.path.abspath(zip_path)
+    self.scratch_dir = scratch_dir
+    self.zip_file = ZipFile(self.zip_path, 'r')
+    self.entries = set(self.zip_file.namelist())
+    self.extracted = {}
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def close(self):
+    self.zip_file.close()
+
+  def contains(self, name):
+    return entryName(name) in self.entries
+
+  def open(self, name):
+    """Open an entry as a binary stream without extracting it."""
+    return self.zip_file.open(entryName(name), 'r')
+
+  def read(self, name):
+    return self.zip_file.read(entryName(name))
+
+  def size(self, name):
+    return self.zip_file.getinfo(entryName(name)).file_size
+
+  def contentKey(self, name):
+    """Key of an entry's bytes from its CRC-32 and size, read from the zip directory."""
+    info = self.zip_file.getinfo(entryName(name))
+    return '%08x-%d' % (info.CRC, info.file_size)
+
+  def parseHome(self, name='Home.xml'):
+    """Parse Home.xml straight from the archive and return its root element."""
+    with self.zip_file.open(name, 'r') as stream:
+      return ElementTree.parse(stream).getroot()
+
+  def extract(self, name):
+    """Copy one entry to the scratch directory and return its path."""
+    name = entryName(name)
+    path = self.extracted.get(name)
+    if path is None:
+      path = self.targetPath(name)
+      with self.zip_file.open(name, 'r') as src, open(path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, chunk_size)
+      self.extracted[name] = path
+    return path
+
+  def extractModel(self, name):
+    """Extract an OBJ model with the MTL files and textures it references."""
+    name = entryName(name)
+    path = self.extracted.get(name)
+    if path is not None:
+      return path
+
+    path = self.targetPath(name)
+    libraries = []
+    with self.zip_file.open(name, 'r') as src, open(path, 'wb') as dst:
+      for line in src:
+        dst.write(line)
+        if line.startswith(b'mtllib'):
+          libraries.extend(line.split()[1:])
+    self.extracted[name] = path
+
+    base = posixpath.dirname(name)
+    for library in libraries:
+      mtl = entryName(posixpath.join(base, library.decode('utf-8', 'replace')))
+      if mtl in self.entries and mtl not in self.extracted:
+        self.extractMaterialLibrary(mtl)
+    return path
+
+  def extractMaterialLibrary(self, name):
+    """Extract an MTL file and the texture maps it references."""
+    path = self.targetPath(name)
+    maps = []
+    with self.zip_file.open(name, 'r') as src, open(path, 'wb') as dst:
+      for line in src:
+        dst.write(line)
+        if line.lstrip().startswith((b'map_', b'bump', b'disp', b'refl')):
+          values = line.split()
+          if len(values) > 1:
+            maps.append(values[-1])
+    self.extracted[name] = path
+
+    base = posixpath.dirname(name)
+    for texture in maps:
+      image = entryName(posixpath.join(base, texture.decode('utf-8', 'replace')))
+      if image in self.entries:
+        self.extract(image)
+    return path
+
+  def targetPath(self, name):
+    if name.startswith('../') or name == '..':
+      raise ValueError('entry outside of the archive: %s' % name)
+    path = os.path.join(self.scratch_dir, *name.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
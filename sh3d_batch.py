@@ -0,0 +1,153 @@
+#  ########################################################################
+#
+#   SweetHome3D XML to Blender batch converter
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# How to use:
+#   blender -b --python sh3d_batch.py -- home1.zip home2.zip --out converted/
+#
+#   Every zip generated by the SweetHome 3D EXPORT to XML/OBJ plugin is
+#   imported with sh3d_xml_to_blender.py in a fresh scene and saved as
+#   <out>/<zip name>.blend (and/or .glb with --format). With --jobs N the
+#   queue is split between N background Blender processes, each decoding
+#   models with its share of the cpus. Every zip is extracted to its own
+#   temporary directory and the textures are packed into the .blend.
+#   The exit status is 1 when at least one home failed.
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import logging
+import subprocess
+import bpy
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import sh3d_xml_to_blender as importer
+
+logger = logging.getLogger('my_logger')
+
+
+def parseArgs(argv):
+  parser = argparse.ArgumentParser(
+    prog='blender -b --python sh3d_batch.py --',
+    description='Convert SweetHome3D XML/OBJ exports to .blend/.glb files.')
+  parser.add_argument('zips', nargs='+', help='zip files generated by the EXPORT to XML/OBJ plugin')
+  parser.add_argument('--out', required=True, help='output directory')
+  parser.add_argument('--format', action='append', choices=('blend', 'glb'),
+                      help='output format, can be repeated (default: blend)')
+  parser.add_argument('--jobs', type=int, default=1,
+                      help='number of background Blender processes sharing the queue')
+  parser.add_argument('--decode-workers', type=int,
+                      help='processes decoding models per Blender process (default: cpus / jobs)')
+  parser.add_argument('--verbose', action='store_true', help='log the import progress')
+  parser.add_argument('--profile', action='store_true',
+                      help='write <zip name>_profile.json/.csv timing reports next to the zip files')
+  parser.add_argument('--cprofile', action='store_true', help='also write <zip name>_profile.prof')
+  return parser.parse_args(argv)
+
+
+def scriptArgs():
+  """Arguments after '--', the ones before belong to Blender."""
+  if '--' in sys.argv:
+    return sys.argv[sys.argv.index('--') + 1:]
+  return []
+
+
+def convert(path, out, formats):
+  """Import one export in a fresh scene and save it in the requested formats."""
+  bpy.ops.wm.read_homefile(use_empty=True)
+  # its own scratch directory, the import of the next zip would empty a shared one
+  importer.scratch_dir = tempfile.mkdtemp(prefix='sh3d_batch_')
+  try:
+    bpy.ops.object.openfile(filepath=os.path.abspath(path))
+
+    base = os.path.join(out, os.path.splitext(os.path.basename(path))[0])
+    if 'blend' in formats:
+      # the extracted textures are removed below
+      bpy.ops.file.pack_all()
+      bpy.ops.wm.save_as_mainfile(filepath=base + '.blend')
+    if 'glb' in formats:
+      bpy.ops.export_scene.gltf(filepath=base + '.glb', export_format='GLB')
+  finally:
+    shutil.rmtree(importer.scratch_dir, True)
+    importer.scratch_dir = None
+
+
+def convertAll(zips, out, formats):
+  if not importer.OpenFile.is_registered:
+    bpy.utils.register_class(importer.OpenFile)
+
+  failed = 0
+  for path in zips:
+    start = time.time()
+    try:
+      convert(path, out, formats)
+    except Exception:
+      failed += 1
+      logger.exception('%s: conversion failed', path)
+      continue
+    logger.warning('%s: converted in %.1fs', path, time.time() - start)
+  return failed
+
+
+def runShards(args, zips):
+  """Split the queue between background Blender processes and wait for them."""
+  jobs = min(args.jobs, len(zips))
+  # one decode pool per process, the cpus are shared between them
+  workers = args.decode_workers or max(1, (os.cpu_count() or 1) // jobs)
+  processes = []
+  for shard in range(jobs):
+    command = [bpy.app.binary_path, '-b', '--factory-startup', '--python', os.path.abspath(__file__),
+               '--'] + zips[shard::jobs] + ['--out', args.out, '--decode-workers', str(workers)]
+    for fmt in args.format:
+      command += ['--format', fmt]
+    for flag in ('verbose', 'profile', 'cprofile'):
+      if getattr(args, flag):
+        command.append('--' + flag)
+    processes.append(subprocess.Popen(command))
+  return sum(1 for p in processes if p.wait() != 0)
+
+
+def main():
+  args = parseArgs(scriptArgs())
+  args.format = args.format or ['blend']
+  logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                      format='%(levelname)s %(message)s')
+  os.makedirs(args.out, exist_ok=True)
+  importer.profile_import = args.profile or args.cprofile
+  importer.profile_cprofile = args.cprofile
+  importer.decode_workers = args.decode_workers
+
+  if args.jobs > 1 and len(args.zips) > 1:
+    failed = runShards(args, args.zips)
+  else:
+    failed = convertAll(args.zips, args.out, args.format)
+  sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,192 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender import benchmark
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# How to use:
+#   python sh3d_bench.py [small medium large] [--repeat 3] [--results bench.jsonl]
+#   blender -b --python sh3d_bench.py -- [small medium large] ...
+#
+#   Every scenario generates a synthetic export with sh3d_synth.py (same
+#   seed, same archive) and times the stages that do not need Blender:
+#   opening the zip, parsing Home.xml into the plan, hashing the models for
+#   the model cache and decoding them, serially and in the process pool.
+#   Run inside Blender, the full import is timed too, with the phases of its
+#   profile report. The best time of the repeats is kept for every stage and
+#   one JSON line per scenario is appended to the results file, with the git
+#   revision, so throughput (pieces and MB per second) can be compared
+#   across versions.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sh3d_archive import HomeArchive
+from sh3d_cache import ModelCache
+from sh3d_obj import decodeModels
+from sh3d_plan import HomePlan
+from sh3d_synth import generateHome
+
+try:
+  import bpy
+except ImportError:
+  # plain python, only the stages without Blender
+  bpy = None
+
+scenarios = {
+  'small': {'levels': 1, 'pieces': 100, 'unique': 0.2, 'group_depth': 0, 'polygons': 200},
+  'medium': {'levels': 2, 'pieces': 1000, 'unique': 0.1, 'group_depth': 2, 'polygons': 500},
+  'large': {'levels': 4, 'pieces': 5000, 'unique': 0.05, 'group_depth': 3, 'polygons': 1000},
+  }
+
+
+def revision():
+  """Git revision of the scripts, None outside of a checkout."""
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                   cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def timed(function):
+  start = time.perf_counter()
+  result = function()
+  return time.perf_counter() - start, result
+
+
+def decodeAll(archive, names, workers):
+  for decoded in decodeModels(archive, names, workers):
+    decoded.release()
+
+
+def headlessStages(zip_path, work_dir):
+  """Seconds of each stage that runs without Blender."""
+  stages = {}
+  stages['open'], archive = timed(lambda: HomeArchive(zip_path, os.path.join(work_dir, 'xml')))
+  with archive:
+    stages['parse'], plan = timed(lambda: HomePlan(archive.parseHome()))
+    names = list(plan.models)
+    cache = ModelCache(os.path.join(work_dir, 'cache'))
+    stages['hash'], _ = timed(lambda: [cache.key(archive, name) for name in names])
+    stages['decode_serial'], _ = timed(lambda: decodeAll(archive, names, 1))
+    stages['decode_pool'], _ = timed(lambda: decodeAll(archive, names, None))
+  return stages
+
+
+def blenderStages(zip_path):
+  """Seconds of the full import and of its profile phases."""
+  import sh3d_xml_to_blender as importer
+  if not importer.OpenFile.is_registered:
+    bpy.utils.register_class(importer.OpenFile)
+  importer.profile_import = True
+  importer.use_model_cache = False
+
+  bpy.ops.wm.read_homefile(use_empty=True)
+  seconds, _ = timed(lambda: bpy.ops.object.openfile(filepath=zip_path))
+  with open(os.path.splitext(zip_path)[0] + '_profile.json') as f:
+    report = json.load(f)
+  stages = {'import': seconds}
+  for phase in report['phases']:
+    stages['import.' + phase['phase']] = phase['seconds']
+  return stages
+
+
+def runScenario(name, params, repeat, seed):
+  work_dir = tempfile.mkdtemp(prefix='sh3d_bench_')
+  try:
+    zip_path = os.path.join(work_dir, name + '.zip')
+    home = generateHome(zip_path, seed=seed, **params)
+
+    best = {}
+    for _ in range(repeat):
+      stages = headlessStages(zip_path, work_dir)
+      if bpy is not None:
+        stages.update(blenderStages(zip_path))
+      for stage, seconds in stages.items():
+        best[stage] = min(seconds, best.get(stage, seconds))
+  finally:
+    shutil.rmtree(work_dir, True)
+
+  megabytes = home['zip_bytes'] / 1e6
+  planned = best['parse'] + best['decode_pool']
+  throughput = {
+    'plan_pieces_per_second': home['pieces'] / planned,
+    'plan_mb_per_second': megabytes / planned,
+    'decode_models_per_second': home['models'] / best['decode_pool'],
+    }
+  if 'import' in best:
+    throughput['import_pieces_per_second'] = home['pieces'] / best['import']
+    throughput['import_mb_per_second'] = megabytes / best['import']
+
+  return {
+    'scenario': name,
+    'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'revision': revision(),
+    'python': platform.python_version(),
+    'blender': bpy.app.version_string if bpy is not None else None,
+    'cpus': os.cpu_count(),
+    'repeat': repeat,
+    'home': home,
+    'seconds': best,
+    'throughput': throughput,
+    }
+
+
+def scriptArgs():
+  """Arguments after '--' inside Blender, all of them for plain python."""
+  if bpy is not None:
+    return sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+  return sys.argv[1:]
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the SweetHome3D import on synthetic homes.')
+  parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                      help='%s (default: small medium)' % ', '.join(sorted(scenarios)))
+  parser.add_argument('--repeat', type=int, default=3, help='runs per scenario, the best is kept')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--results', default='sh3d_bench_results.jsonl',
+                      help='JSON lines file the results are appended to')
+  args = parser.parse_args(scriptArgs())
+  for name in args.scenarios:
+    if name not in scenarios:
+      parser.error('unknown scenario: %s' % name)
+
+  for name in args.scenarios or ['small', 'medium']:
+    result = runScenario(name, scenarios[name], args.repeat, args.seed)
+    with open(args.results, 'a') as f:
+      f.write(json.dumps(result, sort_keys=True) + '\n')
+    print('%-8s %s' % (name, ' '.join('%s=%.1f' % item for item in sorted(result['throughput'].items()))))
+
+
+if __name__ == '__main__':
+  main()
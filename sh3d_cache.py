@@ -0,0 +1,173 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender model cache
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Persistent cache of imported furniture models. Entries are keyed by a hash
+# of the OBJ and MTL bytes found in the export, so the same catalog model is
+# found again whatever its name or path in the next export. Each entry is a
+# .npz file holding the mesh arrays of the template (joined, centered and
+# rotated to Blender axes) and the MTL material dicts read by sh3d_obj, with
+# texture paths relative to the model so another export can resolve them.
+# The cache directory is kept under a size limit by evicting the least
+# recently used entries. This module does not depend on bpy.
+
+import os
+import json
+import zipfile
+import hashlib
+import tempfile
+import posixpath
+import numpy
+
+# bump when the layout of the stored arrays or the template processing changes
+cache_version = 4
+
+# bytes hashed per read
+chunk_size = 1024 * 1024
+
+
+def relativeTextures(materials, model):
+  """Copy of material dicts with texture entries relative to the model directory."""
+  base = posixpath.dirname(model) or '.'
+  materials = [dict(m) for m in materials]
+  for m in materials:
+    if m['texture']:
+      m['texture'] = posixpath.relpath(m['texture'], base)
+  return materials
+
+
+def resolveTextures(materials, model):
+  """Material dicts of relativeTextures with entries of the archive of model again."""
+  base = posixpath.dirname(model)
+  for m in materials:
+    if m['texture']:
+      m['texture'] = posixpath.normpath(posixpath.join(base, m['texture']))
+  return materials
+
+
+def defaultCacheDir():
+  base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+  return os.path.join(base, 'sh3dtoblender')
+
+
+class ModelCache(object):
+  """Content addressed, size bounded store of template mesh arrays."""
+
+  def __init__(self, cache_dir=None, max_size=2 * 1024 ** 3):
+    self.cache_dir = cache_dir or defaultCacheDir()
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+    # bytes in the cache directory, scanned on the first store
+    self.total = None
+    os.makedirs(self.cache_dir, exist_ok=True)
+
+  def key(self, archive, model):
+    """Hash an OBJ entry and the MTL files it references."""
+    digest = hashlib.sha1(b'sh3d-model-%d' % cache_version)
+    libraries = []
+    with archive.open(model) as stream:
+      for line in stream:
+        digest.update(line)
+        if line.startswith(b'mtllib'):
+          libraries.extend(line.split()[1:])
+
+    base = posixpath.dirname(model)
+    for library in libraries:
+      mtl = posixpath.join(base, library.decode('utf-8', 'replace'))
+      if archive.contains(mtl):
+        with archive.open(mtl) as stream:
+          for chunk in iter(lambda: stream.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+  def lodKey(self, key, triangles):
+    """Key of a decimated version of the model of key, next to it in the cache."""
+    return '%s-lod-%d' % (key, triangles)
+
+  def path(self, key):
+    return os.path.join(self.cache_dir, key + '.npz')
+
+  def load(self, key):
+    """Return (arrays, meta) for a key, or None on a miss."""
+    path = self.path(key)
+    try:
+      with numpy.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files if name != 'meta'}
+        meta = json.loads(str(data['meta']))
+    except FileNotFoundError:
+      self.misses += 1
+      return None
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+      # damaged entry, stored again by this import
+      try:
+        os.remove(path)
+      except OSError:
+        pass
+      self.misses += 1
+      return None
+    # refresh the entry for the LRU eviction
+    os.utime(path, None)
+    self.hits += 1
+    return arrays, meta
+
+  def store(self, key, arrays, meta):
+    path = self.path(key)
+    # a temporary file of its own, other imports may store the same key
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+    try:
+      with os.fdopen(fd, 'wb') as stream:
+        numpy.savez(stream, meta=numpy.array(json.dumps(meta)), **arrays)
+      replaced = os.path.getsize(path) if os.path.exists(path) else 0
+      os.replace(tmp, path)
+    except BaseException:
+      os.remove(tmp)
+      raise
+
+    if self.total is None:
+      self.evict()
+    else:
+      self.total += os.path.getsize(path) - replaced
+      if self.total > self.max_size:
+        self.evict()
+
+  def evict(self):
+    """Remove least recently used entries until the cache fits max_size."""
+    entries = []
+    total = 0
+    for entry in os.scandir(self.cache_dir):
+      if entry.is_file() and entry.name.endswith('.npz'):
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    entries.sort()
+    for mtime, size, path in entries:
+      if total <= self.max_size:
+        break
+      try:
+        os.remove(path)
+      except OSError:
+        continue
+      total -= size
+    self.total = total
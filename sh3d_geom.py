@@ -0,0 +1,294 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender geometry helpers
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Matrix math on flat vertex arrays, replacing the mirror, transform_apply and
+# origin_set operators. Vertices are float32 arrays of V*3 values in Blender
+# axes (Z up). This module does not depend on bpy, only on NumPy.
+
+import numpy
+
+# SweetHome3D models are Y up, Blender is Z up: (x, y, z) -> (x, -z, y)
+axis_conversion = numpy.array([
+  [1.0, 0.0, 0.0],
+  [0.0, 0.0, -1.0],
+  [0.0, 1.0, 0.0],
+  ])
+
+mirror_x = numpy.diag([-1.0, 1.0, 1.0])
+
+
+def modelRotationMatrix(value):
+  """Parse a modelRotation attribute (9 values, row major) to a 3x3 matrix."""
+  return numpy.array([float(v) for v in value.split()], dtype=numpy.float64).reshape(3, 3)
+
+
+def vertexBounds(vertices):
+  """Return (min, max) corners of the vertices, zeros for an empty array."""
+  v = vertices.reshape(-1, 3)
+  if not len(v):
+    return numpy.zeros(3), numpy.zeros(3)
+  return v.min(axis=0).astype(numpy.float64), v.max(axis=0).astype(numpy.float64)
+
+
+def centerOnBounds(vertices):
+  """Translate the vertices in place so their bounding box is centered on the origin."""
+  v = vertices.reshape(-1, 3)
+  if len(v):
+    v -= (v.min(axis=0) + v.max(axis=0)) / 2.0
+  return vertices
+
+
+def boxCorners(low, high):
+  """The 8 corners of an axis aligned box, as a flat vertex array."""
+  corners = numpy.array([
+    [x, y, z] for x in (low[0], high[0]) for y in (low[1], high[1]) for z in (low[2], high[2])
+    ], dtype=numpy.float32)
+  return corners.ravel()
+
+
+def variantMatrix(vertices, mirrored=False, rotation=None):
+  """Compose mirror, modelRotation and re-centering into one 4x4 matrix.
+
+  modelRotation is expressed in the Y up space of the model, so it is
+  conjugated by the axis conversion; the mirror flips the model width (X).
+  The translation puts the bounding box center of the result at the origin.
+  """
+  linear = numpy.identity(3)
+  if rotation is not None:
+    if isinstance(rotation, str):
+      rotation = modelRotationMatrix(rotation)
+    linear = axis_conversion @ rotation @ axis_conversion.T
+  if mirrored:
+    linear = mirror_x @ linear
+
+  v = vertices.reshape(-1, 3)
+  center = numpy.zeros(3)
+  if len(v):
+    rotated = v @ linear.T
+    center = (rotated.min(axis=0) + rotated.max(axis=0)) / 2.0
+
+  matrix = numpy.identity(4)
+  matrix[:3, :3] = linear
+  matrix[:3, 3] = -center
+  return matrix
+
+
+def placementMatrix(scale, angle=None, pitch=None):
+  """4x4 matrix of a piece object with its scale and rotation, at the origin.
+
+  Same as the matrix_world Blender computes for rotation_euler
+  (-pitch, 0, -angle) in XYZ order, so the placement needs no depsgraph
+  update.
+  """
+  cx, sx = numpy.cos(-(pitch or 0.0)), numpy.sin(-(pitch or 0.0))
+  cz, sz = numpy.cos(-(angle or 0.0)), numpy.sin(-(angle or 0.0))
+  rx = numpy.array([[1.0, 0.0, 0.0], [0.0, cx, -sx], [0.0, sx, cx]])
+  rz = numpy.array([[cz, -sz, 0.0], [sz, cz, 0.0], [0.0, 0.0, 1.0]])
+  matrix = numpy.identity(4)
+  matrix[:3, :3] = rz @ rx @ numpy.diag(scale)
+  return matrix
+
+
+def transformVertices(vertices, matrix):
+  """Apply a 4x4 matrix to a flat vertex array in one pass."""
+  v = vertices.reshape(-1, 3)
+  out = v @ matrix[:3, :3].T.astype(numpy.float32) + matrix[:3, 3].astype(numpy.float32)
+  return out.astype(numpy.float32).ravel()
+
+
+def transformNormals(normals, matrix):
+  """Apply the rotation, scale and mirror of a 4x4 matrix to flat unit normals."""
+  n = normals.reshape(-1, 3) @ numpy.linalg.inv(matrix[:3, :3]).astype(numpy.float32)
+  length = numpy.linalg.norm(n, axis=1, keepdims=True)
+  return (n / numpy.maximum(length, 1e-12)).astype(numpy.float32).ravel()
+
+
+def selectFaces(arrays, faces):
+  """Arrays of a sub mesh made of some faces (an index array).
+
+  Only the vertices and material slots used by the faces are kept. Returns
+  (arrays, slots), slots giving the original slot of each new one.
+  """
+  totals = arrays['loop_totals'][faces]
+  starts = numpy.zeros(len(faces), dtype=numpy.int32)
+  if len(faces):
+    numpy.cumsum(totals[:-1], out=starts[1:])
+  loop_index = (numpy.repeat(arrays['loop_starts'][faces] - starts, totals) +
+                numpy.arange(totals.sum(), dtype=numpy.int32))
+
+  used, loops = numpy.unique(arrays['loops'][loop_index], return_inverse=True)
+  slots, material_indices = numpy.unique(arrays['material_indices'][faces], return_inverse=True)
+  uvs = arrays['uvs']
+  if len(uvs):
+    uvs = uvs.reshape(-1, 2)[loop_index].ravel()
+
+  sub = {
+    'vertices': arrays['vertices'].reshape(-1, 3)[used].ravel(),
+    'loops': loops.astype(numpy.int32),
+    'loop_starts': starts,
+    'loop_totals': totals,
+    'material_indices': material_indices.astype(numpy.int32),
+    'smooth': arrays['smooth'][faces],
+    'uvs': uvs,
+    }
+  if 'face_groups' in arrays:
+    sub['face_groups'] = arrays['face_groups'][faces]
+  return sub, slots
+
+
+def mergeArrays(parts):
+  """Concatenate mesh arrays into one, baking a 4x4 matrix into each part.
+
+  parts are (arrays, matrix, slots) tuples, slots mapping the material
+  indices of the part to the slots of the merged mesh. Faces of mirroring
+  matrices are reversed.
+  """
+  merged = dict((key, []) for key in ('vertices', 'loops', 'loop_starts', 'loop_totals',
+                                      'material_indices', 'smooth', 'uvs'))
+  with_uvs = any(len(arrays['uvs']) for arrays, matrix, slots in parts)
+  nverts = 0
+  nloops = 0
+  for arrays, matrix, slots in parts:
+    loops = arrays['loops']
+    uvs = arrays['uvs']
+    if flipsWinding(matrix):
+      order = reversedLoops(arrays['loop_starts'], arrays['loop_totals'])
+      loops = loops[order]
+      if len(uvs):
+        uvs = uvs.reshape(-1, 2)[order].ravel()
+    if with_uvs and not len(uvs):
+      uvs = numpy.zeros(len(loops) * 2, dtype=numpy.float32)
+
+    slots = numpy.asarray(slots, dtype=numpy.int32)
+    merged['vertices'].append(transformVertices(arrays['vertices'], matrix))
+    merged['loops'].append(loops + nverts)
+    merged['loop_starts'].append(arrays['loop_starts'] + nloops)
+    merged['loop_totals'].append(arrays['loop_totals'])
+    merged['material_indices'].append(slots[numpy.minimum(arrays['material_indices'], len(slots) - 1)])
+    merged['smooth'].append(arrays['smooth'])
+    merged['uvs'].append(uvs)
+    nverts += len(arrays['vertices']) // 3
+    nloops += len(loops)
+
+  dtypes = {'vertices': numpy.float32, 'smooth': bool, 'uvs': numpy.float32}
+  return dict((key, numpy.concatenate(values).astype(dtypes.get(key, numpy.int32)) if values
+               else numpy.empty(0, dtype=dtypes.get(key, numpy.int32)))
+              for key, values in merged.items())
+
+
+def triangleLoops(loop_starts, loop_totals):
+  """Fan triangulation: (T, 3) loop indices and the face of every triangle."""
+  counts = numpy.maximum(loop_totals - 2, 0)
+  faces = numpy.repeat(numpy.arange(len(loop_starts)), counts)
+  first = numpy.zeros(len(counts), dtype=numpy.int64)
+  if len(counts):
+    numpy.cumsum(counts[:-1], out=first[1:])
+  corner = numpy.arange(len(faces)) - numpy.repeat(first, counts) + 1
+  start = numpy.repeat(loop_starts, counts)
+  return numpy.stack([start, start + corner, start + corner + 1], axis=1), faces
+
+
+def clusterTriangles(vertices, triangles, cells):
+  """Snap vertices to a grid of cells^3 over their bounds.
+
+  Returns (cluster of every vertex, cluster centers, triangles still having
+  three distinct clusters).
+  """
+  v = vertices.reshape(-1, 3)
+  low = v.min(axis=0)
+  size = numpy.maximum(v.max(axis=0) - low, 1e-9)
+  cell = numpy.minimum(((v - low) / size * cells).astype(numpy.int64), cells - 1)
+  keys = (cell[:, 0] * cells + cell[:, 1]) * cells + cell[:, 2]
+  unique, cluster = numpy.unique(keys, return_inverse=True)
+  count = numpy.bincount(cluster).astype(numpy.float64)
+  centers = numpy.stack([numpy.bincount(cluster, v[:, axis]) / count for axis in range(3)], axis=1)
+
+  corners = cluster[triangles]
+  keep = ((corners[:, 0] != corners[:, 1]) & (corners[:, 1] != corners[:, 2]) &
+          (corners[:, 0] != corners[:, 2]))
+  return cluster, centers, keep
+
+
+def decimateArrays(arrays, target):
+  """Triangulated arrays of a mesh decimated by vertex clustering to about target triangles.
+
+  The grid resolution is searched so the result has at most target
+  triangles (when possible, otherwise the coarsest grid leaving any
+  triangle is used); uvs, materials and smooth flags are kept per corner
+  and per face.
+  """
+  tri_loops, tri_faces = triangleLoops(arrays['loop_starts'], arrays['loop_totals'])
+  triangles = arrays['loops'][tri_loops]
+
+  best = None
+  low, high = 1, 256
+  while low <= high:
+    cells = (low + high) // 2
+    cluster, centers, keep = clusterTriangles(arrays['vertices'], triangles, cells)
+    count = keep.sum()
+    if 0 < count <= target:
+      best = (cluster, centers, keep)
+    if count <= target:
+      low = cells + 1
+    else:
+      high = cells - 1
+  if best is None:
+    # a grid of one cell collapses everything, never return an empty mesh
+    for cells in range(2, 257):
+      best = clusterTriangles(arrays['vertices'], triangles, cells)
+      if best[2].any():
+        break
+  cluster, centers, keep = best
+
+  count = int(keep.sum())
+  uvs = arrays['uvs']
+  if len(uvs):
+    uvs = uvs.reshape(-1, 2)[tri_loops[keep]].ravel()
+  faces = tri_faces[keep]
+  return {
+    'vertices': centers.astype(numpy.float32).ravel(),
+    'loops': cluster[triangles[keep]].astype(numpy.int32).ravel(),
+    'loop_starts': numpy.arange(count, dtype=numpy.int32) * 3,
+    'loop_totals': numpy.full(count, 3, dtype=numpy.int32),
+    'material_indices': arrays['material_indices'][faces],
+    'smooth': arrays['smooth'][faces],
+    'uvs': uvs,
+    }
+
+
+def flipsWinding(matrix):
+  return numpy.linalg.det(matrix[:3, :3]) < 0.0
+
+
+def reversedLoops(loop_starts, loop_totals):
+  """Loop permutation reversing every face, keeping its first corner.
+
+  Needed after baking a mirror into the vertices, otherwise the faces
+  would point inwards.
+  """
+  starts = numpy.repeat(loop_starts, loop_totals)
+  totals = numpy.repeat(loop_totals, loop_totals)
+  offsets = numpy.arange(len(starts)) - starts
+  return starts + (totals - offsets) % totals
@@ -35,17 +35,31 @@
 # To render with blender cycles it's necessary inport the materials. Try use https://wiki.blender.org/index.php/Extensions:2.6/Py/Scripts/Material/Blender_Cycles_Materials_Converter
 
 from zipfile import ZipFile
-from xml.etree import cElementTree as ElementTree
 from collections import namedtuple
-from urllib.parse import unquote
     
 import os
+import sys
 import math
 import bpy
 import mathutils
 import struct
 import shutil
 
+# the sh3d_*.py helper modules live next to this script; when it is run from
+# the Text Editor __file__ is not the script path, so look up the text block
+script_dir = os.path.dirname(os.path.abspath(__file__))
+if not os.path.isfile(os.path.join(script_dir, 'sh3d_archive.py')):
+  for text in bpy.data.texts:
+    if text.filepath and os.path.basename(text.filepath) == 'sh3d_html5_to_blender.py':
+      script_dir = os.path.dirname(bpy.path.abspath(text.filepath))
+if script_dir not in sys.path:
+  sys.path.append(script_dir)
+
+from sh3d_archive import HomeArchive
+from sh3d_mesh import meshFromArrays
+from sh3d_obj import readModel
+from sh3d_textures import TextureManager
+
 scale=0.05
 speed=0.5
 
@@ -74,12 +88,12 @@ class OpenFile(bpy.types.Operator):
     #remove old files
     shutil.rmtree(xml_path,True)
     
-    #unzip files
+    #unzip the inner zip, its entries are extracted only when needed
     with ZipFile(zip_path, 'r') as zip_file:
-       zip_file.extractall(html_path)
+       zip_file.extract(os.path.basename(zip_path), html_path)
 
-    with ZipFile(zip2_path, 'r') as zip_file:
-       zip_file.extractall(xml_path)
+    self.archive = HomeArchive(zip2_path, xml_path)
+    self.textures = TextureManager(self.archive)
 
 
     #clear scene
@@ -105,12 +119,11 @@ class OpenFile(bpy.types.Operator):
         bpy.data.textures.remove(tex)
 
 
-    #read xml and files
-    xmlPath = os.path.join(xml_path,'Home.xml')
-    xmlRoot = ElementTree.parse(xmlPath).getroot()
+    #read xml straight from the zip
+    xmlRoot = self.archive.parseHome()
 
     #read house
-    filename=os.path.join(xml_path,xmlRoot.get('structure'))
+    filename=self.archive.extractModel(xmlRoot.get('structure'))
     bpy.ops.import_scene.obj(filepath=filename)
     obs = bpy.context.selected_editable_objects[:] 
     bpy.context.scene.objects.active=obs[0]
@@ -140,7 +153,7 @@ class OpenFile(bpy.types.Operator):
       #if objectName in ('doorOrWindow','pieceOfFurniture'):
       if 'model' in element.keys():  
         print(objectName)   
-        filename=os.path.join(xml_path,unquote(element.get('model')))
+        model=element.get('model')
         dimX = float(element.get('width'))
         dimY = float(element.get('height'))
         dimZ = float(element.get('depth')) 
@@ -161,12 +174,8 @@ class OpenFile(bpy.types.Operator):
           locZ= (dimY*scale/2.0)+lve  
 
         
-        bpy.ops.import_scene.obj(filepath=filename)
-        obs = bpy.context.selected_editable_objects[:] 
+        obs = [self.loadModel(element.get('name'), model)]
         bpy.context.scene.objects.active=obs[0]
-        bpy.ops.object.join()
-        obs[0].name=element.get('name')
-        bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY',center='BOUNDS')     
         if objectName in ('doorOrWindow'):   
            bpy.context.active_object.layers[1]= True  
            bpy.context.active_object.layers[2]= False        
@@ -231,7 +240,7 @@ class OpenFile(bpy.types.Operator):
           if prop.tag == 'texture':
               image=prop.get('image')
               for material in bpy.context.active_object.data.materials:
-                  img = bpy.data.images.load(os.path.join(xml_path,image))
+                  img = self.textures.image(image)
                   tex = bpy.data.textures.new(image, type = 'IMAGE')
                   tex.image = img        
                   mtex = material.texture_slots.add()
@@ -255,7 +264,7 @@ class OpenFile(bpy.types.Operator):
                   image=texture.get('image')
                   for material in bpy.context.active_object.data.materials:
                      if mname in material.name: 
-                       img = bpy.data.images.load(os.path.join(xml_path,image))
+                       img = self.textures.image(image)
                        tex = bpy.data.textures.new(image, type = 'IMAGE')
                        tex.image = img        
                        mtex = material.texture_slots.add()
@@ -416,9 +425,37 @@ class OpenFile(bpy.types.Operator):
     bpy.data.scenes["Scene"].layers[2]=True
     bpy.data.scenes["Scene"].layers[3]=True
     
+    self.archive.close()
     return {'FINISHED'}
 
+  def loadModel(self, name, model):
+    """Read a model with the native OBJ reader and link it, selected, to the scene."""
+    arrays, descs = readModel(self.archive, model, convertAxes=False)
+    # center on the bounding box, like origin_set(center='BOUNDS')
+    vertices = arrays['vertices'].reshape(-1, 3)
+    if len(vertices):
+      vertices -= (vertices.min(axis=0) + vertices.max(axis=0)) / 2.0
+
+    materials = []
+    for desc in descs:
+      material = bpy.data.materials.new(desc['name'])
+      material.diffuse_color = desc['diffuse'][:3]
+      material.alpha = desc['diffuse'][3]
+      img = self.textures.image(desc['texture']) if desc['texture'] else None
+      if img is not None:
+        tex = bpy.data.textures.new(desc['texture'], type = 'IMAGE')
+        tex.image = img
+        mtex = material.texture_slots.add()
+        mtex.texture = tex
+      materials.append(material)
 
+    obj = bpy.data.objects.new(name, meshFromArrays(name, arrays, materials))
+    bpy.context.scene.objects.link(obj)
+    # the OBJ importer converted Y up to Z up with the object rotation
+    obj.rotation_euler = (math.pi/2.0, 0.0, 0.0)
+    bpy.ops.object.select_all(action='DESELECT')
+    obj.select = True
+    return obj
  
   def invoke(self, context, event):
       context.window_manager.fileselect_add(self)
@@ -0,0 +1,125 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender material registry
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Color, texture and shininess overrides of the pieces (<material> elements
+# and the piece color) used to be written into the model materials, which
+# are shared by every piece using the model. The registry instead builds one
+# material per distinct set of parameters, for the model materials (the MTL
+# material dicts read by sh3d_obj) as well as for the overrides, and pieces
+# get override materials in object linked slots so the model materials stay
+# untouched.
+# Every material gets its node tree built in one go: material output,
+# Principled BSDF and, with a texture, one image node.
+# The parameters are kept in a custom property, so a sync import adopts
+# the materials of the previous one instead of building copies.
+
+import json
+import bpy
+
+
+def roughness(shininess, maximum=1.0):
+  """Principled roughness for a shininess going from 0 to maximum."""
+  return 1.0 - min(max(shininess / maximum, 0.0), 1.0) ** 0.5
+
+
+def buildMaterial(name, color, alpha=1.0, rough=None, image=None):
+  """New material with a minimal Principled BSDF node tree."""
+  material = bpy.data.materials.new(name)
+  material.diffuse_color = list(color) + [alpha]
+  material.use_nodes = True
+  nodes = material.node_tree.nodes
+  links = material.node_tree.links
+  nodes.clear()
+
+  output = nodes.new('ShaderNodeOutputMaterial')
+  bsdf = nodes.new('ShaderNodeBsdfPrincipled')
+  bsdf.location = (-300.0, 0.0)
+  links.new(output.inputs['Surface'], bsdf.outputs['BSDF'])
+  bsdf.inputs['Base Color'].default_value = list(color) + [1.0]
+  bsdf.inputs['Alpha'].default_value = alpha
+  if rough is not None:
+    bsdf.inputs['Roughness'].default_value = rough
+  if alpha < 1.0:
+    material.blend_method = 'BLEND'
+
+  if image is not None:
+    tex = nodes.new('ShaderNodeTexImage')
+    tex.location = (-600.0, 0.0)
+    tex.image = image
+    links.new(bsdf.inputs['Base Color'], tex.outputs['Color'])
+  return material
+
+
+class MaterialRegistry(object):
+
+  def __init__(self, textures):
+    self.textures = textures
+    self.materials = {}
+
+  def get(self, name, color, alpha, rough, texture):
+    image = self.textures.image(texture) if texture else None
+    key = (name, tuple(color), alpha, rough, image.name if image is not None else None)
+    material = self.materials.get(key)
+    if material is None:
+      material = buildMaterial(name, color, alpha, rough, image)
+      material['sh3d_material'] = json.dumps([name, [float(c) for c in color], alpha, rough, key[4]])
+      self.materials[key] = material
+    return material
+
+  def adopt(self, materials):
+    """Reuse the materials of a previous import for the same parameters."""
+    for material in materials:
+      if 'sh3d_material' in material:
+        name, color, alpha, rough, image = json.loads(material['sh3d_material'])
+        self.materials.setdefault((name, tuple(color), alpha, rough, image), material)
+
+  def material(self, desc):
+    """Material of a model, from an MTL material dict."""
+    diffuse = desc['diffuse']
+    rough = roughness(desc['shininess'], 1000.0) if desc.get('shininess') else None
+    return self.get(desc['name'], diffuse[:3], diffuse[3], rough, desc.get('texture'))
+
+  def override(self, desc, color=None, texture=None, shininess=None):
+    """Material of a model with a piece's overrides (shininess from 0 to 1)."""
+    if color is None and texture is None and shininess is None:
+      return self.material(desc)
+    diffuse = desc['diffuse']
+    if shininess is not None:
+      rough = roughness(shininess)
+    elif desc.get('shininess'):
+      rough = roughness(desc['shininess'], 1000.0)
+    else:
+      rough = None
+    if texture is None and color is None:
+      texture = desc.get('texture')
+    # a color replaces the texture of the model, like in SweetHome3D
+    return self.get(desc['name'], color or diffuse[:3], diffuse[3], rough, texture)
+
+  def assign(self, obj, slot, material):
+    """Put a material in an object linked slot, leaving the mesh materials alone."""
+    material_slot = obj.material_slots[slot]
+    if material_slot.material is not material:
+      material_slot.link = 'OBJECT'
+      material_slot.material = material
@@ -0,0 +1,173 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender mesh helpers
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Conversion between Blender meshes and flat NumPy arrays, done with the
+# foreach_get/foreach_set bulk accessors. The array layout is:
+#
+#   vertices          float32 (V*3)  vertex coordinates
+#   loops             int32   (L)    vertex index of each face corner
+#   loop_starts       int32   (F)    first loop of each face
+#   loop_totals       int32   (F)    number of loops of each face
+#   material_indices  int32   (F)    material slot of each face
+#   smooth            bool    (F)    smooth shading flag of each face
+#   uvs               float32 (L*2)  uv of each face corner, may be empty
+#   normals           float32 (L*3)  custom normal of each face corner, may be
+#                                    empty or missing
+
+import bpy
+import numpy
+
+from sh3d_geom import transformVertices, transformNormals, flipsWinding, reversedLoops
+
+
+def meshToArrays(mesh):
+  nverts = len(mesh.vertices)
+  nloops = len(mesh.loops)
+  npolys = len(mesh.polygons)
+
+  vertices = numpy.empty(nverts * 3, dtype=numpy.float32)
+  mesh.vertices.foreach_get('co', vertices)
+  loops = numpy.empty(nloops, dtype=numpy.int32)
+  mesh.loops.foreach_get('vertex_index', loops)
+  loop_starts = numpy.empty(npolys, dtype=numpy.int32)
+  mesh.polygons.foreach_get('loop_start', loop_starts)
+  loop_totals = numpy.empty(npolys, dtype=numpy.int32)
+  mesh.polygons.foreach_get('loop_total', loop_totals)
+  material_indices = numpy.empty(npolys, dtype=numpy.int32)
+  mesh.polygons.foreach_get('material_index', material_indices)
+  smooth = numpy.empty(npolys, dtype=bool)
+  mesh.polygons.foreach_get('use_smooth', smooth)
+
+  uvs = numpy.empty(0, dtype=numpy.float32)
+  if mesh.uv_layers.active is not None:
+    uvs = numpy.empty(nloops * 2, dtype=numpy.float32)
+    mesh.uv_layers.active.data.foreach_get('uv', uvs)
+
+  return {
+    'vertices': vertices,
+    'loops': loops,
+    'loop_starts': loop_starts,
+    'loop_totals': loop_totals,
+    'material_indices': material_indices,
+    'smooth': smooth,
+    'uvs': uvs,
+    }
+
+
+def meshVertices(mesh):
+  vertices = numpy.empty(len(mesh.vertices) * 3, dtype=numpy.float32)
+  mesh.vertices.foreach_get('co', vertices)
+  return vertices
+
+
+def transformMesh(mesh, matrix, vertices=None):
+  """Bake a 4x4 matrix into the mesh vertices, fixing the winding of mirrors."""
+  if vertices is None:
+    vertices = meshVertices(mesh)
+  normals = None
+  if mesh.has_custom_normals:
+    normals = loopNormals(mesh)
+  mesh.vertices.foreach_set('co', transformVertices(vertices, matrix))
+
+  if flipsWinding(matrix):
+    npolys = len(mesh.polygons)
+    loop_starts = numpy.empty(npolys, dtype=numpy.int32)
+    mesh.polygons.foreach_get('loop_start', loop_starts)
+    loop_totals = numpy.empty(npolys, dtype=numpy.int32)
+    mesh.polygons.foreach_get('loop_total', loop_totals)
+    order = reversedLoops(loop_starts, loop_totals)
+
+    loops = numpy.empty(len(mesh.loops), dtype=numpy.int32)
+    mesh.loops.foreach_get('vertex_index', loops)
+    mesh.loops.foreach_set('vertex_index', loops[order])
+    for uv_layer in mesh.uv_layers:
+      uvs = numpy.empty(len(mesh.loops) * 2, dtype=numpy.float32)
+      uv_layer.data.foreach_get('uv', uvs)
+      uv_layer.data.foreach_set('uv', uvs.reshape(-1, 2)[order].ravel())
+    mesh.update(calc_edges=True)
+    if normals is not None:
+      normals = normals.reshape(-1, 3)[order].ravel()
+  else:
+    mesh.update()
+  if normals is not None:
+    setNormals(mesh, transformNormals(normals, matrix))
+
+
+def loopNormals(mesh):
+  """Flat array of the normal of every loop."""
+  if hasattr(mesh, 'calc_normals_split'):
+    # blender < 4.1
+    mesh.calc_normals_split()
+  normals = numpy.empty(len(mesh.loops) * 3, dtype=numpy.float32)
+  mesh.loops.foreach_get('normal', normals)
+  return normals
+
+
+def setNormals(mesh, normals):
+  """Set the custom split normals of a mesh from a flat array, one per loop."""
+  if hasattr(mesh, 'use_auto_smooth'):
+    # blender < 4.1 only uses custom normals with auto smooth
+    mesh.use_auto_smooth = True
+  mesh.normals_split_custom_set(normals.reshape(-1, 3))
+
+
+def meshFromArrays(name, arrays, materials=()):
+  """Build a new mesh datablock from the arrays in one bulk pass per attribute."""
+  vertices = arrays['vertices']
+  loops = arrays['loops']
+  loop_starts = arrays['loop_starts']
+
+  mesh = bpy.data.meshes.new(name)
+  mesh.vertices.add(len(vertices) // 3)
+  mesh.vertices.foreach_set('co', vertices)
+  mesh.loops.add(len(loops))
+  mesh.loops.foreach_set('vertex_index', loops)
+  mesh.polygons.add(len(loop_starts))
+  mesh.polygons.foreach_set('loop_start', loop_starts)
+  mesh.polygons.foreach_set('loop_total', arrays['loop_totals'])
+  mesh.polygons.foreach_set('material_index', arrays['material_indices'])
+  mesh.polygons.foreach_set('use_smooth', arrays['smooth'])
+
+  uvs = arrays.get('uvs')
+  if uvs is not None and len(uvs):
+    if hasattr(mesh, 'uv_textures'):
+      # blender 2.7x
+      mesh.uv_textures.new()
+      uv_layer = mesh.uv_layers[-1]
+    else:
+      uv_layer = mesh.uv_layers.new()
+    uv_layer.data.foreach_set('uv', uvs)
+
+  for material in materials:
+    mesh.materials.append(material)
+
+  mesh.update(calc_edges=True)
+  mesh.validate()
+
+  # after validate, unless it removed faces
+  normals = arrays.get('normals')
+  if normals is not None and len(normals) and len(normals) == len(mesh.loops) * 3:
+    setNormals(mesh, normals)
+  return mesh
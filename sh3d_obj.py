@@ -0,0 +1,480 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender OBJ/MTL reader
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Minimal OBJ/MTL reader for the models written by SweetHome3D. The whole
+# file is read as one mesh (objects and groups are joined, like the importer
+# did after bpy.ops.object.join) into the flat arrays used by sh3d_mesh:
+# vertex, uv, normal and face index lines are gathered per kind and converted
+# to NumPy arrays in one call each. Faces with normals are smooth shaded and
+# their normals become custom split normals. Lines and points are ignored.
+# Models can also be decoded in a process pool, see decodeModels.
+# This module does not depend on bpy, only on NumPy.
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import os
+import sys
+import time
+import types
+import posixpath
+import multiprocessing
+import numpy
+
+try:
+  from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+  # python < 3.8, arrays are pickled back from the workers
+  shared_memory = None
+
+from sh3d_archive import HomeArchive
+from sh3d_geom import centerOnBounds
+
+
+def parseObj(data, groups=False):
+  """Parse OBJ bytes.
+
+  Returns (arrays, libraries, material_names) where arrays follows the
+  sh3d_mesh layout, libraries are the mtllib file names and material_names
+  the usemtl names in slot order. Faces whose corners all have a normal are
+  smooth, whatever their s group. With groups, the g/o group names are
+  returned too and arrays['face_groups'] holds the group of every face.
+  """
+  positions = []
+  texcoords = []
+  normals = []
+  corners = []
+  sizes = []
+  face_materials = []
+  face_smooth = []
+  # vertex and uv counts seen before each face, for negative indices
+  face_vbase = []
+  face_tbase = []
+  face_nbase = []
+  libraries = []
+  material_names = []
+  material_slots = {}
+  material = 0
+  smooth = False
+  face_groups = []
+  group_names = ['']
+  group = 0
+  nverts = 0
+  ntexcoords = 0
+  nnormals = 0
+
+  for line in data.splitlines():
+    if line.startswith(b'v '):
+      positions.append(line[2:])
+      nverts += 1
+    elif line.startswith(b'vt '):
+      texcoords.append(line[3:])
+      ntexcoords += 1
+    elif line.startswith(b'vn '):
+      normals.append(line[3:])
+      nnormals += 1
+    elif line.startswith(b'f '):
+      values = line.split()[1:]
+      if len(values) < 3:
+        continue
+      corners.extend(values)
+      sizes.append(len(values))
+      face_materials.append(material)
+      face_smooth.append(smooth)
+      face_vbase.append(nverts)
+      face_tbase.append(ntexcoords)
+      face_nbase.append(nnormals)
+      face_groups.append(group)
+    elif line.startswith(b'usemtl'):
+      values = line.split(None, 1)
+      name = values[1].strip().decode('utf-8', 'replace') if len(values) > 1 else ''
+      if name not in material_slots:
+        material_slots[name] = len(material_names)
+        material_names.append(name)
+      material = material_slots[name]
+    elif line.startswith(b's '):
+      value = line[2:].strip()
+      smooth = value not in (b'off', b'0')
+    elif line.startswith(b'mtllib'):
+      libraries.extend(v.decode('utf-8', 'replace') for v in line.split()[1:])
+    elif groups and line.startswith((b'g ', b'o ')):
+      group = len(group_names)
+      group_names.append(line[2:].strip().decode('utf-8', 'replace'))
+
+  vertices = columns(positions, 3, numpy.float32)
+  uv_table = columns(texcoords, 2, numpy.float32)
+  normal_table = columns(normals, 3, numpy.float32)
+
+  sizes = numpy.array(sizes, dtype=numpy.int32)
+  loop_starts = numpy.zeros(len(sizes), dtype=numpy.int32)
+  if len(sizes):
+    numpy.cumsum(sizes[:-1], out=loop_starts[1:])
+
+  vindex, tindex, nindex = cornerIndices(corners)
+  if len(vindex):
+    vbase = numpy.repeat(numpy.array(face_vbase, dtype=numpy.int64), sizes)
+    loops = resolveIndices(vindex, vbase)
+  else:
+    loops = numpy.empty(0, dtype=numpy.int64)
+
+  uvs = numpy.empty(0, dtype=numpy.float32)
+  if len(uv_table) and tindex is not None:
+    tbase = numpy.repeat(numpy.array(face_tbase, dtype=numpy.int64), sizes)
+    tloops = resolveIndices(tindex, tbase)
+    valid = (tloops >= 0) & (tloops < len(uv_table) // 2)
+    uv_table = uv_table.reshape(-1, 2)
+    uvs = numpy.zeros((len(tloops), 2), dtype=numpy.float32)
+    uvs[valid] = uv_table[tloops[valid]]
+    uvs = uvs.ravel()
+
+  face_smooth = numpy.array(face_smooth, dtype=bool)
+  loop_normals = numpy.empty(0, dtype=numpy.float32)
+  if len(normal_table) and nindex is not None:
+    nbase = numpy.repeat(numpy.array(face_nbase, dtype=numpy.int64), sizes)
+    nloops = resolveIndices(nindex, nbase)
+    valid = (nloops >= 0) & (nloops < len(normal_table) // 3)
+    normal_table = normal_table.reshape(-1, 3)
+    loop_normals = numpy.zeros((len(nloops), 3), dtype=numpy.float32)
+    loop_normals[valid] = normal_table[nloops[valid]]
+    loop_normals = loop_normals.ravel()
+    face_smooth |= numpy.logical_and.reduceat(valid, loop_starts)
+
+  arrays = {
+    'vertices': vertices,
+    'loops': loops.astype(numpy.int32),
+    'loop_starts': loop_starts,
+    'loop_totals': sizes,
+    'material_indices': numpy.array(face_materials, dtype=numpy.int32),
+    'smooth': face_smooth,
+    'uvs': uvs,
+    'normals': loop_normals,
+    }
+  if groups:
+    arrays['face_groups'] = numpy.array(face_groups, dtype=numpy.int32)
+    return arrays, libraries, material_names, group_names
+  return arrays, libraries, material_names
+
+
+def columns(lines, count, dtype):
+  """Convert 'a b c ...' value lines to a flat array keeping count values per line."""
+  if not lines:
+    return numpy.empty(0, dtype=dtype)
+  values = numpy.array(b' '.join(lines).split(), dtype=dtype)
+  if len(values) == len(lines) * count:
+    return values
+  # some lines carry extra values (w, vertex colors): keep the first ones
+  values = [line.split()[:count] for line in lines]
+  return numpy.array(values, dtype=dtype).ravel()
+
+
+def cornerIndices(corners):
+  """Split 'v', 'v/vt', 'v//vn' or 'v/vt/vn' face corners into index arrays.
+
+  Missing uv and normal indices are 0 (OBJ indices start at 1); tindex and
+  nindex are None when no corner has one.
+  """
+  if not corners:
+    return numpy.empty(0, dtype=numpy.int64), None, None
+  joined = b' '.join(corners).replace(b'//', b'/0/')
+  nslashes = joined.count(b'/')
+  if nslashes == 0:
+    return numpy.array(joined.split(), dtype=numpy.int64), None, None
+  if nslashes in (len(corners), 2 * len(corners)) and sameSlashCount(joined):
+    width = nslashes // len(corners) + 1
+    values = numpy.array(joined.replace(b'/', b' ').split(), dtype=numpy.int64)
+    if len(values) == width * len(corners):
+      values = values.reshape(-1, width)
+      return values[:, 0], values[:, 1], values[:, 2] if width == 3 else None
+
+  # mixed corner formats
+  vindex = numpy.empty(len(corners), dtype=numpy.int64)
+  tindex = numpy.zeros(len(corners), dtype=numpy.int64)
+  nindex = numpy.zeros(len(corners), dtype=numpy.int64)
+  for i, corner in enumerate(corners):
+    values = corner.split(b'/')
+    vindex[i] = int(values[0])
+    if len(values) > 1 and values[1]:
+      tindex[i] = int(values[1])
+    if len(values) > 2 and values[2]:
+      nindex[i] = int(values[2])
+  return vindex, tindex, nindex
+
+
+def sameSlashCount(joined):
+  """True when every space separated corner of joined has as many slashes."""
+  chars = numpy.frombuffer(joined, dtype=numpy.uint8)
+  starts = numpy.concatenate(([0], numpy.flatnonzero(chars == ord(' ')) + 1))
+  counts = numpy.add.reduceat((chars == ord('/')).astype(numpy.int32), starts)
+  return counts.min() == counts.max()
+
+
+def resolveIndices(index, base):
+  """Turn 1-based and negative (relative) OBJ indices into 0-based ones."""
+  return numpy.where(index < 0, base + index, index - 1)
+
+
+def parseMtl(data, base=''):
+  """Parse MTL bytes into {name: material dict}.
+
+  Texture paths are returned as archive entries relative to base, the
+  directory of the MTL file.
+  """
+  materials = {}
+  current = None
+  for line in data.splitlines():
+    values = line.split()
+    if not values:
+      continue
+    key = values[0]
+    if key == b'newmtl':
+      name = line.split(None, 1)[1].strip().decode('utf-8', 'replace') if len(values) > 1 else ''
+      current = materialDict(name)
+      materials[name] = current
+    elif current is None:
+      continue
+    elif key == b'Kd' and len(values) >= 4:
+      current['diffuse'][:3] = [float(v) for v in values[1:4]]
+    elif key == b'd' and len(values) >= 2:
+      current['diffuse'][3] = float(values[1])
+    elif key == b'Tr' and len(values) >= 2:
+      current['diffuse'][3] = 1.0 - float(values[1])
+    elif key == b'Ns' and len(values) >= 2:
+      current['shininess'] = float(values[1])
+    elif key == b'map_Kd' and len(values) >= 2:
+      current['texture'] = posixpath.normpath(
+        posixpath.join(base, values[-1].decode('utf-8', 'replace')))
+  return materials
+
+
+def materialDict(name):
+  return {'name': name, 'diffuse': [0.8, 0.8, 0.8, 1.0], 'shininess': 0.0, 'texture': None}
+
+
+def toBlenderAxes(vertices):
+  """Convert Y up OBJ coordinates to Blender's Z up (x, y, z) -> (x, -z, y)."""
+  v = vertices.reshape(-1, 3)
+  out = numpy.empty_like(v)
+  out[:, 0] = v[:, 0]
+  out[:, 1] = -v[:, 2]
+  out[:, 2] = v[:, 1]
+  return out.ravel()
+
+
+def readModel(archive, name, convertAxes=True):
+  """Read an OBJ entry and its MTL files from an archive.
+
+  Returns (arrays, materials) with one material dict per slot.
+  """
+  arrays, libraries, material_names = parseObj(archive.read(name))
+  if convertAxes:
+    arrays['vertices'] = toBlenderAxes(arrays['vertices'])
+    arrays['normals'] = toBlenderAxes(arrays['normals'])
+  return arrays, readMaterials(archive, name, libraries, material_names)
+
+
+def readStructure(archive, name):
+  """Read the structure OBJ of a home, in Blender axes, keeping its groups.
+
+  Returns (arrays, materials, group_names), see parseObj.
+  """
+  arrays, libraries, material_names, group_names = parseObj(archive.read(name), groups=True)
+  arrays['vertices'] = toBlenderAxes(arrays['vertices'])
+  return arrays, readMaterials(archive, name, libraries, material_names), group_names
+
+
+def readMaterials(archive, name, libraries, material_names):
+  """Material dicts of the slots of an OBJ entry, from its MTL files."""
+  base = posixpath.dirname(name)
+  library = {}
+  for mtl in libraries:
+    entry = posixpath.join(base, mtl)
+    if archive.contains(entry):
+      library.update(parseMtl(archive.read(entry), posixpath.dirname(entry)))
+
+  return [library.get(n) or materialDict(n) for n in material_names]
+
+
+#
+# Parallel decoding
+#
+# OBJ parsing is pure CPU work, so the models of a home are decoded in a
+# process pool while Blender (single threaded) only builds the meshes. Each
+# worker opens the archive once and hands its arrays back through one shared
+# memory block per model, avoiding a pickled copy of large vertex buffers.
+#
+
+worker_archive = None
+
+
+class DecodedModel(object):
+  """Arrays and material dicts of a model, possibly backed by shared memory.
+
+  seconds is the time spent decoding the model, in whichever process did it.
+  """
+  __slots__ = ('name', 'arrays', 'materials', 'buffer', 'seconds')
+
+  def __init__(self, name, arrays, materials, buffer=None, seconds=0.0):
+    self.name = name
+    self.arrays = arrays
+    self.materials = materials
+    self.buffer = buffer
+    self.seconds = seconds
+
+  def release(self):
+    """Drop the arrays and free the shared memory block, if any."""
+    self.arrays = None
+    if self.buffer is not None:
+      self.buffer.close()
+      self.buffer.unlink()
+      self.buffer = None
+
+
+def decodeModel(archive, name):
+  """Read a model and center it on its bounds, as a template mesh."""
+  arrays, materials = readModel(archive, name)
+  centerOnBounds(arrays['vertices'])
+  return arrays, materials
+
+
+def initWorker(zip_path):
+  global worker_archive
+  worker_archive = HomeArchive(zip_path, None)
+
+
+def decodeWorker(name):
+  start = time.perf_counter()
+  arrays, materials = decodeModel(worker_archive, name)
+  seconds = time.perf_counter() - start
+  if shared_memory is None:
+    return name, arrays, materials, None, seconds
+
+  size = sum(a.nbytes for a in arrays.values())
+  block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+  layout = []
+  offset = 0
+  for key, a in arrays.items():
+    numpy.ndarray(a.shape, a.dtype, buffer=block.buf, offset=offset)[...] = a
+    layout.append((key, a.dtype.str, a.shape, offset))
+    offset += a.nbytes
+  # the main process owns the block from now on and unlinks it in release()
+  resource_tracker.unregister(block._name, 'shared_memory')
+  block.close()
+  return name, layout, materials, block.name, seconds
+
+
+def attachArrays(layout, block_name):
+  block = shared_memory.SharedMemory(name=block_name)
+  arrays = {}
+  for key, dtype, shape, offset in layout:
+    arrays[key] = numpy.ndarray(shape, numpy.dtype(dtype), buffer=block.buf, offset=offset)
+  return arrays, block
+
+
+def poolContext():
+  """Multiprocessing context able to run workers from inside Blender, or None."""
+  methods = multiprocessing.get_all_start_methods()
+  # fork is only safe on Linux, macOS frameworks don't survive it
+  if sys.platform.startswith('linux') and 'fork' in methods:
+    return multiprocessing.get_context('fork')
+  # spawn runs sys.executable, which is the blender binary in old versions
+  if os.path.basename(sys.executable).lower().startswith('python'):
+    return multiprocessing.get_context('spawn')
+  return None
+
+
+@contextmanager
+def workerMain(context):
+  """Hide the __main__ module from the workers spawned in this block.
+
+  Spawned workers import the __main__ module of the parent again, which is
+  the Text Editor script or sh3d_batch.py: they import bpy and die. Workers
+  only need this module, so they get an empty __main__ instead.
+  """
+  if context.get_start_method() == 'fork':
+    yield
+    return
+  main = sys.modules['__main__']
+  sys.modules['__main__'] = types.ModuleType('__main__')
+  try:
+    yield
+  finally:
+    sys.modules['__main__'] = main
+
+
+def dropFutures(futures):
+  """Cancel pending decodes and free the blocks of the finished ones."""
+  for future in futures:
+    future.cancel()
+  for future in futures:
+    if not future.cancelled() and future.exception() is None:
+      block_name = future.result()[3]
+      if block_name is not None:
+        DecodedModel(None, None, None, shared_memory.SharedMemory(name=block_name)).release()
+
+
+def decodeModels(archive, names, workers=None):
+  """Decode models, in a process pool when workers allows it.
+
+  Yields a DecodedModel per name, in order; call release() once the mesh is
+  built. When the pool breaks (workers that can't start or crash), the
+  remaining models are decoded in this process.
+  """
+  names = list(names)
+  if workers is None:
+    workers = os.cpu_count() or 1
+  workers = min(workers, len(names))
+  context = poolContext() if workers > 1 else None
+
+  done = 0
+  if context is not None:
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=initWorker,
+                             initargs=(archive.zip_path,)) as executor:
+      futures = []
+      try:
+        with workerMain(context):
+          for name in names:
+            futures.append(executor.submit(decodeWorker, name))
+        for future in futures:
+          name, arrays, materials, block_name, seconds = future.result()
+          done += 1
+          block = None
+          if block_name is not None:
+            arrays, block = attachArrays(arrays, block_name)
+          yield DecodedModel(name, arrays, materials, block, seconds)
+      except BrokenProcessPool:
+        # decode the rest serially
+        dropFutures(futures[done:])
+      except BaseException:
+        # closed early (import cancelled) or a model that can't be decoded:
+        # drop the models not started yet and free the blocks of the others,
+        # the workers left them to this process
+        dropFutures(futures[done:])
+        raise
+
+  for name in names[done:]:
+    start = time.perf_counter()
+    arrays, materials = decodeModel(archive, name)
+    yield DecodedModel(name, arrays, materials, seconds=time.perf_counter() - start)
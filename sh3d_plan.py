@@ -0,0 +1,232 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender scene plan
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# First phase of the import: Home.xml is turned into a compact plan of
+# levels, furniture (with groups), material overrides, lights and cameras,
+# with every attribute already converted and model references normalized
+# and counted. The second phase, in sh3d_xml_to_blender.py, only realizes
+# the plan in Blender. This module does not depend on bpy.
+# Pieces also carry hashes of their XML so a re-import can tell which
+# pieces of a previous import moved, changed or stayed the same.
+
+import hashlib
+
+from sh3d_archive import entryName
+
+# attributes that only move, resize or rename a piece, a change of any other
+# attribute or child element means another model, mirror or material
+placement_attributes = frozenset(('name', 'x', 'y', 'elevation', 'angle', 'pitch', 'level',
+                                  'width', 'depth', 'height', 'widthInPlan', 'depthInPlan',
+                                  'heightInPlan', 'visible'))
+
+
+def parseColor(value):
+  """Convert a SweetHome3D AARRGGBB hex color to an (r, g, b) float tuple."""
+  if not value:
+    return None
+  return (int(value[2:4], 16) / 255.0, int(value[4:6], 16) / 255.0, int(value[6:8], 16) / 255.0)
+
+
+def parseFloat(element, key, default=0.0):
+  value = element.get(key)
+  return default if value is None else float(value)
+
+
+def elementHash(element, skip=(), extra=''):
+  """SHA-1 of an element, its attributes but skip and its children."""
+  sha = hashlib.sha1(extra.encode('utf-8'))
+  updateHash(sha, element, skip)
+  return sha.hexdigest()
+
+
+def updateHash(sha, element, skip=()):
+  sha.update(element.tag.encode('utf-8'))
+  for key, value in sorted(element.items()):
+    if key not in skip:
+      sha.update(('\0%s=%s' % (key, value)).encode('utf-8'))
+  for child in element:
+    sha.update(b'\1')
+    updateHash(sha, child)
+  sha.update(b'\2')
+
+
+class LevelPlan(object):
+  __slots__ = ('id', 'name', 'elevation', 'floorThickness', 'height', 'visible')
+
+  def __init__(self, element):
+    self.id = element.get('id')
+    self.name = element.get('name')
+    self.elevation = parseFloat(element, 'elevation')
+    self.floorThickness = parseFloat(element, 'floorThickness')
+    self.height = parseFloat(element, 'height')
+    self.visible = element.get('visible') != 'false' and element.get('viewable') != 'false'
+
+
+class MaterialPlan(object):
+  """A <material> override of a piece, matched by name to the model materials."""
+  __slots__ = ('name', 'color', 'texture', 'shininess')
+
+  def __init__(self, element):
+    self.name = element.get('name')
+    self.color = parseColor(element.get('color'))
+    self.shininess = element.get('shininess') and float(element.get('shininess'))
+    self.texture = None
+    for child in element:
+      if child.tag == 'texture' and child.get('image'):
+        self.texture = entryName(child.get('image'))
+
+
+class LightSourcePlan(object):
+  __slots__ = ('x', 'y', 'z', 'color', 'diameter')
+
+  def __init__(self, element):
+    self.x = parseFloat(element, 'x')
+    self.y = parseFloat(element, 'y')
+    self.z = parseFloat(element, 'z')
+    self.color = parseColor(element.get('color'))
+    self.diameter = element.get('diameter') and float(element.get('diameter'))
+
+
+class FurniturePlan(object):
+  """A piece of furniture, door, window or light using a model.
+
+  hash changes with anything about the piece, its level elevation included,
+  shapeHash only when the mesh or the materials of the piece would change.
+  key identifies the piece between two exports: its id, or its hash for
+  homes saved without ids.
+  """
+  __slots__ = ('id', 'key', 'hash', 'shapeHash', 'kind', 'name', 'model', 'level', 'x', 'y', 'elevation',
+               'width', 'depth', 'height', 'angle', 'pitch', 'mirrored',
+               'rotation', 'visible', 'color', 'texture', 'materials',
+               'power', 'lightSources')
+
+  def __init__(self, element, levels):
+    self.id = element.get('id')
+    self.kind = element.tag
+    self.name = element.get('name')
+    self.model = entryName(element.get('model'))
+    self.level = levels.get(element.get('level'))
+    self.hash = elementHash(element, extra=repr(self.level and self.level.elevation))
+    self.shapeHash = elementHash(element, placement_attributes)
+    self.key = self.id or 'hash:' + self.hash
+    self.x = parseFloat(element, 'x')
+    self.y = parseFloat(element, 'y')
+    self.elevation = parseFloat(element, 'elevation')
+    self.width = parseFloat(element, 'width')
+    self.depth = parseFloat(element, 'depth')
+    self.height = parseFloat(element, 'height')
+    # None when the attribute is missing, the placement differs for 0
+    self.angle = element.get('angle') and float(element.get('angle'))
+    self.pitch = element.get('pitch') and float(element.get('pitch'))
+    self.mirrored = element.get('modelMirrored') == 'true'
+    self.rotation = None
+    if element.get('modelRotation'):
+      self.rotation = tuple(round(float(v), 6) for v in element.get('modelRotation').split())
+    self.visible = element.get('visible') != 'false'
+    self.color = parseColor(element.get('color'))
+    self.texture = None
+    self.materials = []
+    self.power = element.get('power') and float(element.get('power'))
+    self.lightSources = []
+    for child in element:
+      if child.tag == 'material':
+        self.materials.append(MaterialPlan(child))
+      elif child.tag == 'texture' and child.get('image'):
+        self.texture = entryName(child.get('image'))
+      elif child.tag == 'lightSource':
+        self.lightSources.append(LightSourcePlan(child))
+
+
+class GroupPlan(object):
+  __slots__ = ('id', 'key', 'name', 'visible', 'children')
+
+  def __init__(self, element):
+    self.id = element.get('id')
+    self.name = element.get('name')
+    self.key = self.id or self.name
+    self.visible = element.get('visible') != 'false'
+    self.children = []
+
+
+class CameraPlan(object):
+  __slots__ = ('kind', 'attribute', 'x', 'y', 'z', 'yaw', 'pitch', 'fieldOfView')
+
+  def __init__(self, element):
+    self.kind = element.tag
+    self.attribute = element.get('attribute')
+    self.x = parseFloat(element, 'x')
+    self.y = parseFloat(element, 'y')
+    self.z = parseFloat(element, 'z')
+    self.yaw = parseFloat(element, 'yaw')
+    self.pitch = parseFloat(element, 'pitch')
+    self.fieldOfView = parseFloat(element, 'fieldOfView')
+
+
+class HomePlan(object):
+  """Everything the import needs from Home.xml.
+
+  models maps each model entry to the number of pieces using it, in the
+  order the models first appear.
+  """
+  __slots__ = ('name', 'structure', 'levels', 'items', 'models', 'pieceCount', 'cameras')
+
+  def __init__(self, root):
+    self.name = root.get('name')
+    self.structure = root.get('structure') and entryName(root.get('structure'))
+    self.levels = {}
+    self.items = []
+    self.models = {}
+    self.pieceCount = 0
+    self.cameras = []
+
+    for element in root.iter('level'):
+      level = LevelPlan(element)
+      self.levels[level.id] = level
+    self.items = self.planItems(root)
+
+  def planItems(self, parent):
+    items = []
+    for element in parent:
+      if element.tag == 'furnitureGroup':
+        group = GroupPlan(element)
+        group.children = self.planItems(element)
+        items.append(group)
+      elif 'model' in element.keys():
+        piece = FurniturePlan(element, self.levels)
+        self.models[piece.model] = self.models.get(piece.model, 0) + 1
+        self.pieceCount += 1
+        items.append(piece)
+      elif element.tag in ('observerCamera', 'camera'):
+        self.cameras.append(CameraPlan(element))
+    return items
+
+  def pieces(self, items=None):
+    """Iterate over all the pieces, groups flattened."""
+    for item in self.items if items is None else items:
+      if isinstance(item, GroupPlan):
+        for piece in self.pieces(item.children):
+          yield piece
+      else:
+        yield item
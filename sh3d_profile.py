@@ -0,0 +1,155 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender import profiling
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Timing of the import phases (archive, Home.xml, structure, models, pieces,
+# materials...) and of every model: wall time, number of calls, vertex and
+# face counts, and the peak resident memory of the process at the end of
+# each phase. The report is written as JSON (everything) and CSV (one row per
+# phase and per model), optionally with a cProfile dump of the whole import.
+# A disabled profile records nothing and its phases cost one function call.
+# This module does not depend on bpy.
+
+import sys
+import csv
+import json
+import time
+import cProfile
+
+try:
+  import resource
+except ImportError:
+  # windows, no peak memory
+  resource = None
+
+
+def peakMemory():
+  """Peak resident memory of the process in bytes, None when unknown."""
+  if resource is None:
+    return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # bytes on macOS, kilobytes elsewhere
+  return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Phase(object):
+  __slots__ = ('profile', 'name', 'start')
+
+  def __init__(self, profile, name):
+    self.profile = profile
+    self.name = name
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc):
+    self.profile.record(self.name, time.perf_counter() - self.start)
+    return False
+
+
+class NoPhase(object):
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    return False
+
+
+no_phase = NoPhase()
+
+
+class ImportProfile(object):
+  """Per phase and per model measures of one import."""
+
+  def __init__(self, enabled=False, use_cprofile=False):
+    self.enabled = enabled
+    self.phases = {}
+    self.order = []
+    self.models = []
+    self.counters = {}
+    self.start = time.perf_counter()
+    self.profiler = cProfile.Profile() if enabled and use_cprofile else None
+    if self.profiler is not None:
+      self.profiler.enable()
+
+  def phase(self, name):
+    """Context manager adding its wall time to a phase."""
+    if not self.enabled:
+      return no_phase
+    return Phase(self, name)
+
+  def record(self, name, seconds, calls=1):
+    stats = self.phases.get(name)
+    if stats is None:
+      stats = self.phases[name] = {'phase': name, 'seconds': 0.0, 'calls': 0, 'peak_memory': None}
+      self.order.append(name)
+    stats['seconds'] += seconds
+    stats['calls'] += calls
+    stats['peak_memory'] = peakMemory()
+
+  def model(self, name, source, vertices, faces, seconds):
+    """Measures of one model, source is 'cache' or 'decoded'."""
+    if self.enabled:
+      self.models.append({'model': name, 'source': source, 'vertices': int(vertices),
+                          'faces': int(faces), 'seconds': seconds})
+
+  def count(self, name, value=1):
+    if self.enabled:
+      self.counters[name] = self.counters.get(name, 0) + value
+
+  def report(self):
+    return {
+      'total_seconds': time.perf_counter() - self.start,
+      'peak_memory': peakMemory(),
+      'phases': [self.phases[name] for name in self.order],
+      'models': self.models,
+      'counters': self.counters,
+      }
+
+  def write(self, base):
+    """Write base.json, base.csv and, with cProfile, base.prof."""
+    if not self.enabled:
+      return
+    if self.profiler is not None:
+      self.profiler.disable()
+      self.profiler.dump_stats(base + '.prof')
+
+    report = self.report()
+    with open(base + '.json', 'w') as f:
+      json.dump(report, f, indent=2)
+
+    with open(base + '.csv', 'w', newline='') as f:
+      writer = csv.writer(f)
+      writer.writerow(['kind', 'name', 'seconds', 'calls', 'vertices', 'faces', 'peak_memory', 'source'])
+      for stats in report['phases']:
+        writer.writerow(['phase', stats['phase'], '%.6f' % stats['seconds'], stats['calls'],
+                         '', '', stats['peak_memory'] or '', ''])
+      for stats in report['models']:
+        writer.writerow(['model', stats['model'], '%.6f' % stats['seconds'], 1,
+                         stats['vertices'], stats['faces'], '', stats['source']])
+      writer.writerow(['total', '', '%.6f' % report['total_seconds'], '', '', '',
+                       report['peak_memory'] or '', ''])
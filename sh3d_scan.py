@@ -0,0 +1,201 @@
+#  ########################################################################
+#
+#   SweetHome3D XML/OBJ export pre-flight scan
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# How to use:
+#   python sh3d_scan.py home.zip [--json] [--top 20] [--heavy 0.25] [--max-triangles N]
+#
+#   Reports what importing an export will cost before running Blender: for
+#   every model its vertex, face and triangle counts, the number of pieces
+#   using it and the triangles they add up to, and the megapixels of the
+#   textures, sorted by instanced triangles. Models holding more than the
+#   --heavy share of all the triangles are flagged. Only Home.xml, the OBJ
+#   and MTL files and the image headers are read from the zip; nothing is
+#   extracted and this does not depend on bpy.
+#   With --max-triangles the exit status is 1 when the home has more.
+
+import re
+import sys
+import json
+import struct
+import argparse
+import posixpath
+
+from sh3d_archive import HomeArchive, entryName
+from sh3d_plan import HomePlan
+
+face_line = re.compile(rb'^f[ \t]+(.*)$', re.M)
+vertex_line = re.compile(rb'^v[ \t]', re.M)
+map_line = re.compile(rb'^\s*map_\w+\s.*?(\S+)\s*$', re.M)
+mtllib_line = re.compile(rb'^mtllib[ \t]+(.*)$', re.M)
+
+# bytes read from an image to find its size
+image_header_size = 64 * 1024
+
+
+def objCounts(data):
+  """(vertices, faces, triangles) of OBJ bytes, counted without parsing the values."""
+  faces = face_line.findall(data)
+  corners = sum(len(face.split()) for face in faces)
+  return len(vertex_line.findall(data)), len(faces), max(corners - 2 * len(faces), 0)
+
+
+def imageSize(header):
+  """(width, height) of PNG, JPEG, GIF or BMP bytes, None when unknown."""
+  if header.startswith(b'\x89PNG') and len(header) >= 24:
+    return struct.unpack('>II', header[16:24])
+  if header[:6] in (b'GIF87a', b'GIF89a'):
+    return struct.unpack('<HH', header[6:10])
+  if header.startswith(b'BM') and len(header) >= 26:
+    width, height = struct.unpack('<ii', header[18:26])
+    return width, abs(height)
+  if header.startswith(b'\xff\xd8'):
+    i = 2
+    while i + 9 < len(header):
+      if header[i] != 0xff:
+        i += 1
+        continue
+      marker = header[i + 1]
+      length = struct.unpack('>H', header[i + 2:i + 4])[0]
+      # start of frame markers, not DHT/JPG/DAC
+      if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+        height, width = struct.unpack('>HH', header[i + 5:i + 9])
+        return width, height
+      i += 2 + length
+  return None
+
+
+class ExportScan(object):
+  """Cost of the models and textures of an export zip."""
+
+  def __init__(self, zip_path):
+    self.imageSizes = {}
+    with HomeArchive(zip_path, None) as archive:
+      self.archive = archive
+      plan = HomePlan(archive.parseHome())
+      self.name = plan.name
+      self.pieces = plan.pieceCount
+      self.models = [self.scanModel(model, count) for model, count in plan.models.items()]
+      self.structure = self.scanModel(plan.structure, 1) if plan.structure else None
+      for piece in plan.pieces():
+        for texture in [piece.texture] + [m.texture for m in piece.materials]:
+          if texture:
+            self.megapixels(texture)
+    self.archive = None
+    self.models.sort(key=lambda m: m['instanced_triangles'], reverse=True)
+
+  def megapixels(self, entry):
+    """Megapixels of an image entry, read once, 0 when missing or unknown."""
+    entry = entryName(entry)
+    if entry not in self.imageSizes:
+      size = None
+      if self.archive.contains(entry):
+        with self.archive.open(entry) as stream:
+          size = imageSize(stream.read(image_header_size))
+      self.imageSizes[entry] = size[0] * size[1] / 1e6 if size else 0.0
+    return self.imageSizes[entry]
+
+  def scanModel(self, model, count):
+    info = {'model': model, 'instances': count, 'vertices': 0, 'faces': 0, 'triangles': 0,
+            'texture_megapixels': 0.0, 'bytes': 0, 'missing': not self.archive.contains(model)}
+    if not info['missing']:
+      data = self.archive.read(model)
+      info['bytes'] = len(data)
+      info['vertices'], info['faces'], info['triangles'] = objCounts(data)
+      textures = set()
+      base = posixpath.dirname(model)
+      for libraries in mtllib_line.findall(data):
+        for library in libraries.split():
+          mtl = entryName(posixpath.join(base, library.decode('utf-8', 'replace')))
+          if self.archive.contains(mtl):
+            for texture in map_line.findall(self.archive.read(mtl)):
+              textures.add(entryName(posixpath.join(posixpath.dirname(mtl), texture.decode('utf-8', 'replace'))))
+      info['texture_megapixels'] = sum(self.megapixels(texture) for texture in textures)
+    info['instanced_triangles'] = info['triangles'] * count
+    return info
+
+  def report(self, heavy=0.25):
+    total = sum(m['instanced_triangles'] for m in self.models)
+    if self.structure is not None:
+      total += self.structure['triangles']
+    for model in self.models:
+      model['share'] = model['instanced_triangles'] / total if total else 0.0
+      model['heavy'] = model['share'] >= heavy
+    return {
+      'name': self.name,
+      'pieces': self.pieces,
+      'unique_models': len(self.models),
+      'total_triangles': total,
+      'template_triangles': sum(m['triangles'] for m in self.models),
+      'texture_megapixels': sum(self.imageSizes.values()),
+      'structure': self.structure,
+      'models': self.models,
+      'heavy_models': [m['model'] for m in self.models if m['heavy']],
+      }
+
+
+def printReport(report, top):
+  print('%s: %d pieces, %d models, %d triangles instanced (%d in templates), %.1f texture megapixels' % (
+    report['name'] or 'home', report['pieces'], report['unique_models'], report['total_triangles'],
+    report['template_triangles'], report['texture_megapixels']))
+  if report['structure']:
+    print('structure: %d vertices, %d triangles' % (report['structure']['vertices'],
+                                                    report['structure']['triangles']))
+  print('%-6s %9s %9s %5s %11s %6s %7s  %s' % ('', 'vertices', 'triangles', 'count', 'instanced', 'share',
+                                               'texMP', 'model'))
+  for model in report['models'][:top]:
+    flag = 'HEAVY' if model['heavy'] else ('MISSING' if model['missing'] else '')
+    print('%-6s %9d %9d %5d %11d %5.1f%% %7.1f  %s' % (flag, model['vertices'], model['triangles'],
+                                                       model['instances'], model['instanced_triangles'],
+                                                       model['share'] * 100.0, model['texture_megapixels'],
+                                                       model['model']))
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Report the triangle and texture budget of a SweetHome3D export.')
+  parser.add_argument('zips', nargs='+', help='zip files generated by the EXPORT to XML/OBJ plugin')
+  parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+  parser.add_argument('--top', type=int, default=20, help='models listed in the text report')
+  parser.add_argument('--heavy', type=float, default=0.25,
+                      help='share of all the triangles flagging a model as heavy')
+  parser.add_argument('--max-triangles', type=int, help='exit status 1 when a home has more triangles')
+  args = parser.parse_args(argv)
+
+  reports = []
+  for path in args.zips:
+    report = ExportScan(path).report(args.heavy)
+    report['zip'] = path
+    reports.append(report)
+    if not args.json:
+      printReport(report, args.top)
+  if args.json:
+    json.dump(reports, sys.stdout, indent=2)
+    print()
+  if args.max_triangles is not None and any(r['total_triangles'] > args.max_triangles for r in reports):
+    return 1
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,115 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender structure classification
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# The structure OBJ of an export holds every wall and room of every level as
+# its own group (wall_*, room_*, ground...). Instead of splitting it into one
+# object per group, all its faces are classified in one pass: the kind from
+# the group name (walls, floors and ceilings of the rooms, ground), or from
+# the face normal for unknown groups, and the level from the height of the
+# group center. Each (level, kind) class then becomes one mesh.
+# This module does not depend on bpy, only on NumPy.
+
+import numpy
+
+kinds = ('Walls', 'Floors', 'Ceilings', 'Ground')
+
+# group name prefixes, checked in order
+group_kinds = (
+  ('wall', 'Walls'),
+  ('room', 'Rooms'),
+  ('floor', 'Rooms'),
+  ('ceiling', 'Rooms'),
+  ('ground', 'Ground'),
+  )
+
+
+def groupKind(name):
+  """Kind of a structure group from its name, None when unknown."""
+  name = name.lower()
+  for prefix, kind in group_kinds:
+    if name.startswith(prefix):
+      return kind
+  return None
+
+
+def faceNormalsZ(arrays):
+  """Z of the unit normal of every face, from its first three corners."""
+  v = arrays['vertices'].reshape(-1, 3)
+  loops = arrays['loops']
+  starts = arrays['loop_starts']
+  if not len(starts):
+    return numpy.empty(0)
+  p0 = v[loops[starts]]
+  normals = numpy.cross(v[loops[starts + 1]] - p0, v[loops[starts + 2]] - p0)
+  length = numpy.linalg.norm(normals, axis=1)
+  return normals[:, 2] / numpy.maximum(length, 1e-12)
+
+
+def groupCenters(arrays, group_count):
+  """Height of the bounding box center of every group, 0 for empty groups."""
+  z = arrays['vertices'].reshape(-1, 3)[arrays['loops'], 2]
+  loop_groups = numpy.repeat(arrays['face_groups'], arrays['loop_totals'])
+  low = numpy.full(group_count, numpy.inf)
+  high = numpy.full(group_count, -numpy.inf)
+  numpy.minimum.at(low, loop_groups, z)
+  numpy.maximum.at(high, loop_groups, z)
+  empty = low > high
+  low[empty] = high[empty] = 0.0
+  return (low + high) / 2.0
+
+
+def classifyStructure(arrays, group_names, bottoms=()):
+  """Split the structure faces by level and kind.
+
+  bottoms are the heights where the levels start (their elevation less
+  their floor thickness), ascending. Returns {(level index, kind): face
+  indices}, level index 0 when there are no levels.
+  """
+  nz = faceNormalsZ(arrays)
+  face_groups = arrays['face_groups']
+
+  named = [groupKind(name) for name in group_names]
+  face_named = numpy.array(named, dtype=object)[face_groups] if len(face_groups) else numpy.empty(0, object)
+  by_normal = numpy.where(nz > 0.5, 'Floors', numpy.where(nz < -0.5, 'Ceilings', 'Walls')).astype(object)
+  face_kinds = numpy.where(face_named == None, by_normal, face_named)
+  # rooms hold the floor and the ceiling, told apart by the normal
+  rooms = face_kinds == 'Rooms'
+  face_kinds[rooms] = numpy.where(nz[rooms] < -0.5, 'Ceilings', 'Floors')
+
+  if len(bottoms) > 1:
+    centers = groupCenters(arrays, len(group_names))
+    group_levels = numpy.searchsorted(numpy.asarray(bottoms), centers, side='right') - 1
+    face_levels = numpy.maximum(group_levels, 0)[face_groups]
+  else:
+    face_levels = numpy.zeros(len(face_groups), dtype=numpy.int64)
+
+  classes = {}
+  for kind in kinds:
+    of_kind = face_kinds == kind
+    if not of_kind.any():
+      continue
+    for level in numpy.unique(face_levels[of_kind]):
+      classes[(int(level), kind)] = numpy.nonzero(of_kind & (face_levels == level))[0]
+  return classes
@@ -0,0 +1,294 @@
+#  ########################################################################
+#
+#   Synthetic SweetHome3D XML/OBJ export generator
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# How to use:
+#   python sh3d_synth.py home.zip --levels 3 --pieces 2000 --unique 0.1 --group-depth 2 --polygons 500
+#
+#   Writes a zip laid out like the ones of the EXPORT to XML/OBJ plugin:
+#   Home.xml, the structure OBJ (walls and rooms of every level, Y up, in
+#   cm) and furniture models with their MTL files and PNG textures.
+#   Everything is derived from the seed, so the same parameters always give
+#   the same archive. Used by sh3d_bench.py, does not depend on bpy.
+
+from xml.etree import ElementTree
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import sys
+import math
+import zlib
+import struct
+import random
+import argparse
+import numpy
+
+# size of a room side and of a level, in cm
+room_size = 400.0
+wall_thickness = 10.0
+level_height = 250.0
+floor_thickness = 12.0
+
+
+def pngBytes(pixels):
+  """Encode an (height, width, 3) uint8 array as PNG."""
+  height, width = pixels.shape[:2]
+  rows = numpy.zeros((height, width * 3 + 1), dtype=numpy.uint8)
+  rows[:, 1:] = pixels.reshape(height, -1)
+
+  def chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+  return (b'\x89PNG\r\n\x1a\n' +
+          chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+          chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)) +
+          chunk(b'IEND', b''))
+
+
+def checkerTexture(rng, size=64):
+  """Checker board of two random colors."""
+  colors = numpy.array([[rng.randrange(256) for _ in range(3)] for _ in range(2)], dtype=numpy.uint8)
+  y, x = numpy.mgrid[0:size, 0:size]
+  return pngBytes(colors[((x // 8) + (y // 8)) % 2])
+
+
+def boxFaces(low, high, subdivisions=1):
+  """Vertices, uvs and quads of a box whose sides are split in subdivisions^2 quads."""
+  n = subdivisions
+  steps = numpy.linspace(0.0, 1.0, n + 1)
+  u, v = numpy.meshgrid(steps, steps)
+  u = u.ravel()
+  v = v.ravel()
+  low = numpy.asarray(low, dtype=float)
+  size = numpy.asarray(high, dtype=float) - low
+  vertices = []
+  for axis in range(3):
+    a, b = (axis + 1) % 3, (axis + 2) % 3
+    for side in (0.0, 1.0):
+      grid = numpy.empty((len(u), 3))
+      grid[:, axis] = side
+      grid[:, a] = u if side else v
+      grid[:, b] = v if side else u
+      vertices.append(low + grid * size)
+  vertices = numpy.concatenate(vertices)
+
+  # quads of one (n+1) x (n+1) grid, repeated for the six sides
+  i, j = numpy.meshgrid(numpy.arange(n), numpy.arange(n))
+  first = (j * (n + 1) + i).ravel()
+  grid_quads = numpy.stack([first, first + 1, first + n + 2, first + n + 1], axis=1)
+  quads = numpy.concatenate([grid_quads + side * (n + 1) ** 2 for side in range(6)])
+  uvs = numpy.tile(numpy.stack([u, v], axis=1), (6, 1))
+  return vertices, uvs, quads
+
+
+def boxNormals(subdivisions=1):
+  """Normals of the vertices of boxFaces, the one of their side."""
+  sides = numpy.array([[-1, 0, 0], [1, 0, 0], [0, -1, 0], [0, 1, 0], [0, 0, -1], [0, 0, 1]], dtype=float)
+  return numpy.repeat(sides, (subdivisions + 1) ** 2, axis=0)
+
+
+def objBytes(vertices, uvs, groups, mtllib=None, normals=None):
+  """OBJ text of named groups of quads: groups is a list of (name, material, quads).
+
+  With normals (one per vertex), the corners are written as v/vt/vn like
+  SweetHome3D does.
+  """
+  lines = []
+  if mtllib:
+    lines.append('mtllib %s' % mtllib)
+  lines.extend('v %.4f %.4f %.4f' % tuple(v) for v in vertices)
+  lines.extend('vt %.4f %.4f' % tuple(t) for t in uvs)
+  if normals is not None:
+    lines.extend('vn %.4f %.4f %.4f' % tuple(n) for n in normals)
+  corner = '%d/%d/%d' if normals is not None else '%d/%d'
+  face = 'f ' + ' '.join([corner] * 4)
+  width = 3 if normals is not None else 2
+  for name, material, quads in groups:
+    lines.append('g %s' % name)
+    if material:
+      lines.append('usemtl %s' % material)
+    quads = quads + 1
+    lines.extend(face % tuple(numpy.repeat(q, width)) for q in quads)
+  return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def modelFiles(rng, index, polygons, texture):
+  """OBJ and MTL bytes of a furniture model with about polygons quads and two materials."""
+  subdivisions = max(1, int(round(math.sqrt(polygons / 6.0))))
+  size = [rng.uniform(20.0, 200.0) for _ in range(3)]
+  vertices, uvs, quads = boxFaces([-s / 2.0 for s in size], [s / 2.0 for s in size], subdivisions)
+  half = len(quads) // 2
+  name = 'model%d' % index
+  obj = objBytes(vertices, uvs, [(name, 'body', quads[:half]), (name + '_top', 'top', quads[half:])],
+                 name + '.mtl', boxNormals(subdivisions))
+
+  lines = ['newmtl body', 'Kd %.3f %.3f %.3f' % tuple(rng.random() for _ in range(3)), 'Ns 20',
+           'newmtl top', 'Kd 1 1 1', 'Ns 200']
+  if texture:
+    lines.append('map_Kd %s' % texture)
+  return obj, ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def structureFiles(levels, rooms):
+  """OBJ of the walls and rooms of every level, rooms x rooms per level."""
+  vertices = []
+  uvs = []
+  groups = []
+  count = 0
+
+  def add(name, low, high):
+    v, t, q = boxFaces(low, high)
+    groups.append((name, None, q + sum(len(x) for x in vertices)))
+    vertices.append(v)
+    uvs.append(t)
+
+  side = rooms * room_size
+  for level in range(levels):
+    base = level * (level_height + floor_thickness)
+    for r in range(rooms):
+      for c in range(rooms):
+        count += 1
+        x, z = c * room_size, r * room_size
+        add('room_%d_%d' % (level, count), (x, base - floor_thickness, z),
+            (x + room_size, base, z + room_size))
+    for line in range(rooms + 1):
+      position = line * room_size
+      count += 1
+      add('wall_%d_%d' % (level, count), (position - wall_thickness / 2.0, base, 0.0),
+          (position + wall_thickness / 2.0, base + level_height, side))
+      count += 1
+      add('wall_%d_%d' % (level, count), (0.0, base, position - wall_thickness / 2.0),
+          (side, base + level_height, position + wall_thickness / 2.0))
+
+  return objBytes(numpy.concatenate(vertices), numpy.concatenate(uvs), groups)
+
+
+def generateHome(path, levels=1, pieces=100, unique=0.2, group_depth=0, polygons=200,
+                 textures=8, rooms=4, ids=True, seed=0):
+  """Write a synthetic export zip and return a dict describing it.
+
+  unique is the ratio of distinct models to pieces, group_depth nests that
+  many furnitureGroup levels around part of the furniture, polygons is the
+  number of quads of each model and textures the number of distinct images
+  (each one also stored under a second name, as exports often do).
+  """
+  rng = random.Random(seed)
+  model_count = max(1, int(round(pieces * unique)))
+  side = rooms * room_size
+
+  home = ElementTree.Element('home', {'version': '6400', 'name': 'synthetic', 'structure': 'Home.obj',
+                                      'wallHeight': str(level_height)})
+  for level in range(levels):
+    ElementTree.SubElement(home, 'level', {
+      'id': 'level%d' % level, 'name': 'Level %d' % level,
+      'elevation': str(level * (level_height + floor_thickness)),
+      'floorThickness': str(floor_thickness), 'height': str(level_height),
+      'elevationIndex': str(level)})
+  ElementTree.SubElement(home, 'observerCamera', {
+    'attribute': 'observerCamera', 'x': str(side / 2.0), 'y': str(side / 2.0), 'z': '170',
+    'yaw': '0.5', 'pitch': '0.1', 'fieldOfView': '1.0'})
+
+  # pieces in nested groups of 4, the rest directly in the home
+  grouped = pieces // 2 if group_depth else 0
+  parents = []
+  for start in range(0, grouped, 4):
+    parent = home
+    for depth in range(group_depth):
+      parent = ElementTree.SubElement(parent, 'furnitureGroup', {
+        'id': 'furnitureGroup-%d-%d' % (start, depth), 'name': 'Group %d.%d' % (start, depth)})
+    parents.extend([parent] * min(4, grouped - start))
+  parents.extend([home] * (pieces - grouped))
+
+  kinds = ('pieceOfFurniture',) * 8 + ('doorOrWindow', 'light')
+  for i, parent in enumerate(parents):
+    kind = rng.choice(kinds)
+    model = rng.randrange(model_count)
+    attributes = {
+      'level': 'level%d' % rng.randrange(levels), 'name': '%s %d' % (kind, i),
+      'model': 'model%d/model%d.obj' % (model, model),
+      'x': '%.1f' % rng.uniform(0.0, side), 'y': '%.1f' % rng.uniform(0.0, side),
+      'elevation': '%.1f' % rng.choice((0.0, 0.0, 0.0, 75.0)),
+      'width': '%.1f' % rng.uniform(30.0, 200.0), 'depth': '%.1f' % rng.uniform(30.0, 120.0),
+      'height': '%.1f' % rng.uniform(40.0, 220.0)}
+    if ids:
+      attributes['id'] = '%s-%d' % (kind, i)
+    if rng.random() < 0.6:
+      attributes['angle'] = '%.4f' % rng.uniform(0.0, 2.0 * math.pi)
+    if rng.random() < 0.05:
+      attributes['pitch'] = '%.4f' % (math.pi / 2.0)
+    if rng.random() < 0.2:
+      attributes['modelMirrored'] = 'true'
+    if rng.random() < 0.1:
+      attributes['modelRotation'] = '1 0 0 0 0 1 0 -1 0'
+    if rng.random() < 0.2:
+      attributes['color'] = 'FF%06X' % rng.randrange(1 << 24)
+    if kind == 'light':
+      attributes['power'] = '0.5'
+    piece = ElementTree.SubElement(parent, kind, attributes)
+    if rng.random() < 0.2:
+      ElementTree.SubElement(piece, 'material', {'name': 'top', 'color': 'FF%06X' % rng.randrange(1 << 24),
+                                                 'shininess': '0.25'})
+    if kind == 'light':
+      ElementTree.SubElement(piece, 'lightSource', {'x': '0.5', 'y': '0.5', 'z': '0.8', 'color': 'FFFFE0B0'})
+
+  size = 0
+  with ZipFile(path, 'w', ZIP_DEFLATED) as archive:
+    archive.writestr('Home.xml', ElementTree.tostring(home, encoding='utf-8'))
+    archive.writestr('Home.obj', structureFiles(levels, rooms))
+    images = [checkerTexture(rng) for _ in range(textures)]
+    for t, image in enumerate(images):
+      archive.writestr('textures/texture%d.png' % t, image)
+      archive.writestr('textures/copy%d.png' % t, image)
+    for m in range(model_count):
+      texture = None
+      if textures:
+        texture = '../textures/%s%d.png' % (rng.choice(('texture', 'copy')), rng.randrange(textures))
+      obj, mtl = modelFiles(rng, m, polygons, texture)
+      archive.writestr('model%d/model%d.obj' % (m, m), obj)
+      archive.writestr('model%d/model%d.mtl' % (m, m), mtl)
+    size = sum(info.compress_size for info in archive.infolist())
+
+  return {'levels': levels, 'pieces': pieces, 'models': model_count, 'group_depth': group_depth,
+          'polygons': polygons, 'textures': textures, 'rooms': rooms, 'seed': seed, 'zip_bytes': size}
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Write a synthetic SweetHome3D XML/OBJ export zip.')
+  parser.add_argument('zip', help='zip file to write')
+  parser.add_argument('--levels', type=int, default=1)
+  parser.add_argument('--pieces', type=int, default=100)
+  parser.add_argument('--unique', type=float, default=0.2, help='ratio of distinct models to pieces')
+  parser.add_argument('--group-depth', type=int, default=0, help='nested furnitureGroup levels')
+  parser.add_argument('--polygons', type=int, default=200, help='quads per model')
+  parser.add_argument('--textures', type=int, default=8, help='distinct texture images')
+  parser.add_argument('--rooms', type=int, default=4, help='rooms per side on every level')
+  parser.add_argument('--no-ids', action='store_true', help='leave out the piece ids, like old homes')
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args(argv)
+  info = generateHome(args.zip, args.levels, args.pieces, args.unique, args.group_depth, args.polygons,
+                      args.textures, args.rooms, not args.no_ids, args.seed)
+  print(info)
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,99 @@
+#  ########################################################################
+#
+#   SweetHome3D to Blender texture manager
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Texture images of an import, shared by content: exports often ship the
+# same texture under many names, and every name with the same CRC-32 and
+# size in the zip directory gets the same image datablock, without reading
+# the entries. Images are only extracted and created when a material asks
+# for them.
+# Optionally, textures larger than max_size are downscaled to a power of two
+# and saved as PNG in the cache directory, where the next imports find them.
+
+import os
+import bpy
+
+from sh3d_archive import entryName
+from sh3d_cache import defaultCacheDir
+
+
+class TextureManager(object):
+
+  def __init__(self, archive, max_size=None, cache_dir=None):
+    self.archive = archive
+    self.max_size = max_size
+    self.cache_dir = os.path.join(cache_dir or defaultCacheDir(), 'textures')
+    self.images = {}
+
+  def image(self, entry):
+    """Image datablock for an archive entry, None when the entry is missing."""
+    entry = entryName(entry)
+    if not self.archive.contains(entry):
+      return None
+    key = self.archive.contentKey(entry)
+    image = self.images.get(key)
+    if image is None:
+      image = self.loadImage(entry, key)
+      # found again by adopt
+      image['sh3d_texture'] = key
+      image['sh3d_max_size'] = self.max_size or 0
+      self.images[key] = image
+    return image
+
+  def adopt(self, images):
+    """Reuse the images of a previous import with the same content and size limit."""
+    for image in images:
+      if 'sh3d_texture' in image and image.get('sh3d_max_size') == (self.max_size or 0):
+        self.images.setdefault(image['sh3d_texture'], image)
+
+  def loadImage(self, entry, key):
+    if self.max_size:
+      cached = os.path.join(self.cache_dir, '%s_%d.png' % (key, self.max_size))
+      if os.path.isfile(cached):
+        return bpy.data.images.load(cached, check_existing=True)
+
+    image = bpy.data.images.load(self.archive.extract(entry), check_existing=True)
+    if self.max_size:
+      self.downscale(image, cached)
+    return image
+
+  def downscale(self, image, path):
+    """Shrink an image to fit max_size, keeping power of two sizes, and save it as PNG."""
+    width, height = image.size
+    if max(width, height) <= self.max_size:
+      return
+    ratio = float(self.max_size) / max(width, height)
+    image.scale(powerOfTwo(width * ratio), powerOfTwo(height * ratio))
+    os.makedirs(self.cache_dir, exist_ok=True)
+    image.filepath_raw = path
+    image.file_format = 'PNG'
+    image.save()
+
+
+def powerOfTwo(value):
+  """Largest power of two not above value, at least 1."""
+  size = 1
+  while size * 2 <= value:
+    size *= 2
+  return size
@@ -34,25 +34,95 @@
 # It's possible use the imported model with blender render and blender engine (the script add Logic blocks for FPS game like behavior)
 # To render with blender cycles it's necessary inport the materials. Try use https://wiki.blender.org/index.php/Extensions:2.6/Py/Scripts/Material/Blender_Cycles_Materials_Converter
 
-from zipfile import ZipFile
-from xml.etree import cElementTree as ElementTree
-from collections import namedtuple
-from urllib.parse import unquote
     
 import os
+import sys
 import math
+import time
 import bpy
 import mathutils
 import struct
+import json
 import shutil
 import logging
+import numpy
+
+# the sh3d_*.py helper modules live next to this script; when it is run from
+# the Text Editor __file__ is not the script path, so look up the text block
+script_dir = os.path.dirname(os.path.abspath(__file__))
+if not os.path.isfile(os.path.join(script_dir, 'sh3d_archive.py')):
+  for text in bpy.data.texts:
+    if text.filepath and os.path.basename(text.filepath) == 'sh3d_xml_to_blender.py':
+      script_dir = os.path.dirname(bpy.path.abspath(text.filepath))
+if script_dir not in sys.path:
+  sys.path.append(script_dir)
+
+from sh3d_archive import HomeArchive
+from sh3d_cache import ModelCache, relativeTextures, resolveTextures
+from sh3d_mesh import meshFromArrays, meshToArrays, meshVertices, transformMesh
+from sh3d_geom import vertexBounds, boxCorners, transformVertices, variantMatrix, placementMatrix, selectFaces, mergeArrays, decimateArrays
+from sh3d_structure import classifyStructure
+from sh3d_obj import decodeModels, readStructure
+from sh3d_plan import HomePlan, GroupPlan
+from sh3d_textures import TextureManager
+from sh3d_materials import MaterialRegistry
+from sh3d_profile import ImportProfile
 
 scale=0.01
 speed=0.5
 
+# persistent cache of imported models, shared between imports
+use_model_cache=True
+model_cache_dir=None  # None: ~/.cache/sh3dtoblender
+model_cache_size=2*1024**3
+
+# textures bigger than this are downscaled into the cache, None keeps them
+max_texture_size=None
+
+# processes decoding OBJ models in parallel, None: one per cpu, 1: no pool
+decode_workers=None
+
+# directory the models and textures are extracted to, None: 'xml' next to
+# the zip file (shared by the zips of a directory)
+scratch_dir=None
+
+# update the scene of a previous import instead of rebuilding it: only the
+# pieces added, removed or changed in Home.xml are created, removed or moved
+sync_import=False
+
+# write <zip name>_profile.json and .csv next to the zip file: wall time,
+# calls and peak memory per import phase, time and size per model;
+# profile_cprofile adds a cProfile dump, <zip name>_profile.prof
+profile_import=False
+profile_cprofile=False
+
+# merge the structure and the furniture (not the doors, windows and lights)
+# of every level into one mesh with the transforms baked in, for real time
+# walkthroughs; the pieces cannot be edited or synced one by one anymore
+merge_static=False
+
+# level of detail meshes for dense models, None disables them. A model gets
+# lod_count decimated meshes when it has more triangles than lod_density per
+# square metre of the surface of its pieces' boxes, each LOD with 4 times
+# fewer triangles than the previous one. Pieces further than lod_distances
+# (m) from the observer camera use LOD 1, 2...; setLod() switches them all
+lod_density=None
+lod_count=2
+lod_distances=(5.0, 15.0)
+lod_min_triangles=12
+
+# import from a timer, modal_chunk_seconds at a time, with a progress bar
+# and Esc to cancel; background (batch) imports always run at once
+modal_import=True
+modal_chunk_seconds=0.1
+
+# with the logger at DEBUG, the placement details are logged for one piece
+# in log_sample, 1 logs every piece
+log_sample=1
+
 
 logger = logging.getLogger('my_logger')
-logger.debug('effective level' + str(logger.getEffectiveLevel()))
+logger.debug('effective level %d', logger.getEffectiveLevel())
 
 class OpenFile(bpy.types.Operator):
   bl_idname = "object.openfile"
@@ -80,26 +150,203 @@ class OpenFile(bpy.types.Operator):
     bpy.context.view_layer.active_layer_collection = layerColl
 
   def calcBounds(self, verts):
-    """Calculates the bounding box for selected vertices. Requires applied scale to work correctly. """
+    """Calculates the bounding box of an (n, 3) vertex array. """
 
     # [+x, -x, +y, -y, +z, -z]
-    v = verts[0]
-    bounds = [v[0], v[0], v[1], v[1], v[2], v[2]]
-
-    for v in verts:
-      if bounds[0] < v[0]:
-          bounds[0] = v[0]
-      if bounds[1] > v[0]:
-          bounds[1] = v[0]
-      if bounds[2] < v[1]:
-          bounds[2] = v[1]
-      if bounds[3] > v[1]:
-          bounds[3] = v[1]
-      if bounds[4] < v[2]:
-          bounds[4] = v[2]
-      if bounds[5] > v[2]:
-          bounds[5] = v[2]
-    return bounds
+    low = verts.min(axis=0)
+    high = verts.max(axis=0)
+    return [high[0], low[0], high[1], low[1], high[2], low[2]]
+
+  def loadModels(self, pieces):
+    """Create the mesh of every model used by the pieces.
+
+    Models found in the model cache are built directly, the others are
+    decoded in parallel first. Yields after every model, for the progress.
+    """
+    names = {}
+    surfaces = {}
+    for piece in pieces:
+      names.setdefault(piece.model, piece.name)
+      if lod_density:
+        w, d, h = piece.width*scale, piece.depth*scale, piece.height*scale
+        surfaces[piece.model] = max(surfaces.get(piece.model, 0.0), 2.0*(w*d + w*h + d*h))
+
+    pending = []
+    cacheKeys = {}
+    for model, name in names.items():
+      if model in self.modelMeshes:
+        # template mesh of the previous import, see adoptTemplates
+        logger.info('+ reusing object <%s>', model)
+        if lod_density and model not in self.lodMeshes:
+          key = self.modelCache.key(self.archive, model) if self.modelCache is not None else None
+          self.createLods(name, model, meshToArrays(self.modelMeshes[model]), key, surfaces[model])
+        yield model
+        continue
+      cached = None
+      if self.modelCache is not None:
+        cacheKeys[model] = self.modelCache.key(self.archive, model)
+        cached = self.modelCache.load(cacheKeys[model])
+      if cached is not None:
+        logger.info('+ loading cached object <%s>', model)
+        arrays, meta = cached
+        start = time.perf_counter()
+        self.createModelMesh(name, model, arrays, resolveTextures(meta['materials'], model))
+        if lod_density:
+          self.createLods(name, model, arrays, cacheKeys.get(model), surfaces[model])
+        self.profileModel(model, 'cache', arrays, time.perf_counter() - start)
+        yield model
+      else:
+        pending.append(model)
+
+    for decoded in decodeModels(self.archive, pending, decode_workers):
+      logger.info('+ loading object <%s>', decoded.name)
+      if decoded.name in cacheKeys:
+        self.modelCache.store(cacheKeys[decoded.name], decoded.arrays,
+                              {'materials': relativeTextures(decoded.materials, decoded.name)})
+      start = time.perf_counter()
+      self.createModelMesh(names[decoded.name], decoded.name, decoded.arrays, decoded.materials)
+      if lod_density:
+        self.createLods(names[decoded.name], decoded.name, decoded.arrays, cacheKeys.get(decoded.name),
+                        surfaces[decoded.name])
+      self.profileModel(decoded.name, 'decoded', decoded.arrays, decoded.seconds + time.perf_counter() - start)
+      decoded.release()
+      yield decoded.name
+
+  def profileModel(self, model, source, arrays, seconds):
+    self.profile.model(model, source, len(arrays['vertices']) // 3, len(arrays['loop_starts']), seconds)
+
+  def createModelMesh(self, name, model, arrays, materials):
+    mesh = meshFromArrays(name, arrays, [self.materials.material(m) for m in materials])
+    self.tagMesh(mesh, (model, False, None), 0)
+    mesh['sh3d_materials'] = json.dumps(materials)
+    self.modelMeshes[model] = mesh
+    self.modelMaterials[model] = materials
+    self.meshBounds[mesh.name] = vertexBounds(arrays['vertices'])
+    return mesh
+
+  def createLods(self, name, model, arrays, cacheKey, surface):
+    """Decimated meshes of a model denser than lod_density, cached with the model."""
+    budget = max(int(lod_density * surface), lod_min_triangles)
+    triangles = int((arrays['loop_totals'] - 2).sum())
+    if triangles <= budget:
+      return
+
+    meshes = []
+    materials = self.modelMeshes[model].materials
+    for level in range(1, lod_count + 1):
+      target = max(budget // 4 ** (level - 1), lod_min_triangles)
+      lod = None
+      if cacheKey is not None:
+        cached = self.modelCache.load(self.modelCache.lodKey(cacheKey, target))
+        lod = cached and cached[0]
+      if lod is None:
+        lod = decimateArrays(arrays, target)
+        if cacheKey is not None:
+          self.modelCache.store(self.modelCache.lodKey(cacheKey, target), lod, {})
+      logger.info('+ LOD%d of <%s>: %d triangles', level, model, len(lod['loop_starts']))
+      mesh = meshFromArrays('%s LOD%d' % (name, level), lod, list(materials))
+      self.tagMesh(mesh, (model, False, None), level)
+      meshes.append(mesh)
+    self.lodMeshes[model] = meshes
+
+  def variantLods(self, model, mirrored, rotation):
+    """LOD meshes of a model variant, transformed like the variantMesh."""
+    key = (model, mirrored, rotation or None)
+    meshes = self.variantLodMeshes.get(key)
+    if meshes is None:
+      matrix = self.variantMatrices.get(key)
+      meshes = []
+      for level, base in enumerate(self.lodMeshes.get(model, ()), 1):
+        mesh = base
+        if matrix is not None:
+          mesh = base.copy()
+          transformMesh(mesh, matrix)
+          self.tagMesh(mesh, key, level, matrix)
+        meshes.append(mesh)
+      self.variantLodMeshes[key] = meshes
+    return meshes
+
+  def assignLod(self, obj, meshes):
+    """Keep the LOD meshes of an object and use the one for its camera distance."""
+    for mesh in meshes:
+      mesh.use_fake_user = True
+    obj['sh3d_lods'] = [mesh.name for mesh in meshes]
+    level = 1
+    if self.observer is not None:
+      distance = (obj.location - self.observer).length
+      level = sum(1 for d in lod_distances if distance >= d)
+    obj.data = meshes[min(level, len(meshes) - 1)]
+
+  def tagMesh(self, mesh, key, level, matrix=None):
+    """Record the model, variant and LOD level of a mesh, for adoptTemplates."""
+    model, mirrored, rotation = key
+    mesh['sh3d_mesh'] = json.dumps([model, mirrored, list(rotation) if rotation else None, level])
+    if matrix is not None:
+      mesh['sh3d_matrix'] = [float(v) for v in matrix.ravel()]
+
+  def adoptTemplates(self):
+    """Reuse the meshes, materials and images of the previous import.
+
+    The models of a sync import keep their template, variant and LOD meshes
+    instead of being loaded again as copies ('Chair.001'), and new pieces
+    share the materials and textures of the kept ones.
+    """
+    lods = {}
+    for mesh in bpy.data.meshes:
+      if 'sh3d_mesh' not in mesh:
+        continue
+      model, mirrored, rotation, level = json.loads(mesh['sh3d_mesh'])
+      key = (model, mirrored, tuple(rotation) if rotation else None)
+      if level:
+        lods.setdefault(key, {})[level] = mesh
+      elif key == (model, False, None):
+        self.modelMeshes[model] = mesh
+        self.modelMaterials[model] = json.loads(mesh['sh3d_materials'])
+      else:
+        self.variantMeshes[key] = mesh
+        self.variantMatrices[key] = numpy.array(list(mesh['sh3d_matrix'])).reshape(4, 4)
+    for key, meshes in lods.items():
+      levels = [meshes[level] for level in sorted(meshes)]
+      if key[1:] == (False, None):
+        self.lodMeshes[key[0]] = levels
+      else:
+        self.variantLodMeshes[key] = levels
+    self.textures.adopt(bpy.data.images)
+    self.materials.adopt(bpy.data.materials)
+
+  def materialSlots(self, model, name):
+    """Slots of a model whose material name contains name, computed once."""
+    key = (model, name)
+    slots = self.slotIndex.get(key)
+    if slots is None:
+      materials = self.modelMaterials[model]
+      slots = self.slotIndex[key] = [i for i, m in enumerate(materials) if name in m['name']]
+    return slots
+
+  def variantMesh(self, model, mirrored, rotation):
+    """Mesh of a model with its mirror and modelRotation applied.
+
+    Pieces using the same model, mirror flag and modelRotation share one mesh
+    datablock and differ only by their object transform.
+    """
+    key = (model, mirrored, rotation or None)
+    mesh = self.variantMeshes.get(key)
+    if mesh is not None:
+      return mesh
+
+    base = self.modelMeshes[model]
+    if not mirrored and not rotation:
+      self.variantMeshes[key] = base
+      return base
+    vertices = meshVertices(base)
+    matrix = variantMatrix(vertices, mirrored, numpy.array(rotation).reshape(3, 3) if rotation else None)
+    mesh = base.copy()
+    transformMesh(mesh, matrix, vertices)
+    self.tagMesh(mesh, key, 0, matrix)
+    self.meshBounds[mesh.name] = vertexBounds(meshVertices(mesh))
+    self.variantMeshes[key] = mesh
+    self.variantMatrices[key] = matrix
+    return mesh
 
   def execute(self, context):
       
@@ -109,47 +356,317 @@ class OpenFile(bpy.types.Operator):
 
     zip_path = os.path.abspath(zip_name)
     zip_dir = os.path.dirname(zip_path)
-    self.xml_path = os.path.join(zip_dir, 'xml')
+    self.xml_path = scratch_dir or os.path.join(zip_dir, 'xml')
+    self.profile_base = os.path.splitext(zip_path)[0] + '_profile'
+
+    self.profile = ImportProfile(profile_import, profile_cprofile)
+    # per piece diagnostics, checked once here instead of for every message
+    self.debug = logger.isEnabledFor(logging.DEBUG)
+    self.trace = False
 
-    #remove old files
-    shutil.rmtree(self.xml_path,True)
+    #remove old files, unless the images of the pieces kept by a sync
+    #import still use them; entries extracted again are overwritten
+    if not sync_import:
+      shutil.rmtree(self.xml_path,True)
     
-    #unzip files
-    with ZipFile(zip_path, 'r') as zip_file:
-       zip_file.extractall(self.xml_path)
+    #open zip, entries are extracted only when the import needs them
+    with self.profile.phase('archive'):
+      self.archive = HomeArchive(zip_path, self.xml_path)
+    self.textures = TextureManager(self.archive, max_texture_size, model_cache_dir)
+    self.materials = MaterialRegistry(self.textures)
+    self.modelCache = None
+    self.library = {}
+    self.modelMeshes = {}
+    self.modelMaterials = {}
+    self.slotIndex = {}
+    self.meshBounds = {}
+    self.variantMeshes = {}
+    self.variantMatrices = {}
+    self.lodMeshes = {}
+    self.variantLodMeshes = {}
+    self.collections = None
+    self.done = 0
+    self.total = 1
+    if use_model_cache:
+      self.modelCache = ModelCache(model_cache_dir, model_cache_size)
 
+    # the import runs as a generator, stepped at once or from a timer
+    self.steps = self.importHome()
+    if modal_import and context.window is not None and not bpy.app.background:
+      wm = context.window_manager
+      self.timer = wm.event_timer_add(0.01, window=context.window)
+      wm.modal_handler_add(self)
+      wm.progress_begin(0, 100)
+      return {'RUNNING_MODAL'}
+
+    try:
+      for _ in self.steps:
+        pass
+      return self.finishImport(False)
+    finally:
+      self.closeImport()
+
+  def modal(self, context, event):
+    """Run the import for modal_chunk_seconds on every timer event, Esc cancels it."""
+    if event.type == 'ESC' and event.value == 'PRESS':
+      self.steps.close()
+      return self.endModal(context, True)
+    if event.type != 'TIMER':
+      return {'PASS_THROUGH'}
+
+    deadline = time.perf_counter() + modal_chunk_seconds
+    try:
+      for _ in self.steps:
+        if time.perf_counter() >= deadline:
+          context.window_manager.progress_update(100 * self.done // self.total)
+          context.workspace.status_text_set('Importing %s: %d/%d, Esc to cancel' % (
+            os.path.basename(self.filepath), self.done, self.total))
+          return {'RUNNING_MODAL'}
+    except Exception:
+      self.cancel(context)
+      raise
+    return self.endModal(context, False)
+
+  def cancel(self, context):
+    """Stop the timer and the progress report, the import can't go on."""
+    context.window_manager.event_timer_remove(self.timer)
+    context.window_manager.progress_end()
+    context.workspace.status_text_set(None)
+    self.steps.close()
+    self.closeImport()
+
+  def endModal(self, context, cancelled):
+    context.window_manager.event_timer_remove(self.timer)
+    context.window_manager.progress_end()
+    context.workspace.status_text_set(None)
+    try:
+      return self.finishImport(cancelled)
+    finally:
+      self.closeImport()
+
+  def closeImport(self):
+    if self.archive is not None:
+      self.archive.close()
+      self.archive = None
+      self.profile.write(self.profile_base)
+
+  def importHome(self):
+    """Import the home, yielding after each unit of work (structure, model, piece).
+
+    self.done and self.total count them for the progress report. Closing the
+    generator stops the import between two pieces: every object already in
+    the scene is complete, placed and tagged.
+    """
+    context = bpy.context
+
+    #read xml straight from the zip and plan the import
+    with self.profile.phase('parse'):
+      self.plan = HomePlan(self.archive.parseHome())
+    self.profile.count('pieces', self.plan.pieceCount)
+    self.profile.count('models', len(self.plan.models))
 
-    #clear scene
     bpy.data.scenes["Scene"].unit_settings.scale_length=1.0
-    bpy.ops.object.mode_set(mode='OBJECT')
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
+    if context.object is not None and context.object.mode != 'OBJECT':
+      bpy.ops.object.mode_set(mode='OBJECT')
+
+    self.levels = sorted(self.plan.levels.values(), key=lambda level: level.elevation)
+    self.levelIndex = dict((level.id, i) for i, level in enumerate(self.levels))
+    # objects merged per level at the end, with merge_static
+    self.staticObjects = []
+    # LODs are chosen by the distance to the observer camera
+    self.observer = None
+    for camera in self.plan.cameras:
+      if camera.attribute == 'observerCamera':
+        self.observer = mathutils.Vector((camera.x*scale, -camera.y*scale, camera.z*scale))
+
+    with self.profile.phase('scene'):
+      collections = self.findHome() if sync_import else None
+      if collections is not None and collections['home'].get('sh3d_merged'):
+        # merged pieces cannot be matched, import again
+        collections = None
+      if collections is None:
+        self.removePreviousImport()
+        self.createCollections(context)
+      else:
+        logger.info('+ updating previous import')
+        self.collections = collections
+        structure = self.collections['structure']
+        self.removeObjects(list(structure.all_objects))
+        bpy.data.batch_remove(list(self.childCollections(structure)))
+    yield
+
+    #pieces of a previous import that can stay, the others are rebuilt;
+    #matched before the structure, which then shares the adopted materials
+    self.previous = {}
+    self.groups = {}
+    if collections is not None:
+      with self.profile.phase('match'):
+        self.matchPieces()
+
+    #
+    # read house structure
+    #
+    with self.profile.phase('structure'):
+      self.loadStructure()
+    self.done += 1
+    yield
+
+    queue = []
+    self.queueObjectTree(self.plan.items, self.collections['home'], queue)
+    pieces = [piece for piece in self.plan.pieces() if piece not in self.previous]
+    self.total = 1 + len(set(piece.model for piece in pieces)) + len(queue)
+
+    #load every model used by the new pieces once, then place the pieces
+    with self.profile.phase('models'):
+      for _ in self.loadModels(pieces):
+        self.done += 1
+        yield
+    if self.modelCache is not None:
+      self.profile.count('model_cache_hits', self.modelCache.hits)
+      self.profile.count('model_cache_misses', self.modelCache.misses)
+
+    self.progress = 0
+    with self.profile.phase('pieces'):
+      for piece, collection in queue:
+        if piece in self.previous:
+          self.updatePiece(piece, self.previous[piece], collection)
+        else:
+          self.loadPiece(piece, collection)
+        self.done += 1
+        yield
+
+  def finishImport(self, cancelled):
+    """Complete the scene with the pieces loaded so far.
+
+    A cancelled import keeps its objects and is flagged sh3d_partial on the
+    Home collection; a sync import of the same home completes it.
+    """
+    if self.collections is None:
+      logger.info('+ import cancelled')
+      return {'CANCELLED'}
 
-    #clear collections
-    colls = bpy.data.collections
-    for coll in colls:
+    # the objects were placed without evaluating the depsgraph, once for all
+    bpy.context.view_layer.update()
+
+    home = self.collections['home']
+    if cancelled:
+      logger.info('+ import cancelled after %d/%d', self.done, self.total)
+      home['sh3d_partial'] = True
+      return {'CANCELLED'}
+    if 'sh3d_partial' in home:
+      del home['sh3d_partial']
+
+    if merge_static:
+      with self.profile.phase('merge'):
+        self.mergeStatic()
+
+    #groups gone from the home
+    for coll in self.groups.values():
       bpy.data.collections.remove(coll)
 
-    #clear images
-    imgs = bpy.data.images
-    for image in imgs:
-        image.user_clear()
+    #insert camera  
+    # FIXME: Disabled for now
+    for camera in self.plan.cameras:
+      if camera.attribute == 'observerCamera' and False:
+        self.loadCamera(camera)
 
-    #clear materials
-    for material in bpy.data.materials:
-        material.user_clear()
-        bpy.data.materials.remove(material)    
+    #world settings
+    if False:
+        bpy.data.worlds["World"].light_settings.use_ambient_occlusion=True
+        bpy.data.worlds["World"].light_settings.ao_factor=0.01
+        bpy.data.worlds["World"].light_settings.use_environment_light=True
+        bpy.data.worlds["World"].light_settings.environment_energy=0.01
+        
+        bpy.data.scenes["Scene"].unit_settings.system='METRIC'
+        bpy.data.scenes["Scene"].unit_settings.scale_length=0.01/scale
+        bpy.data.scenes["Scene"].layers[0]=True
+        bpy.data.scenes["Scene"].layers[1]=True
+        bpy.data.scenes["Scene"].layers[2]=True
+        bpy.data.scenes["Scene"].layers[3]=True
         
-    #clear textures
-    textures = bpy.data.textures
-    for tex in textures:
-        tex.user_clear()
-        bpy.data.textures.remove(tex)
 
+    logger.info('END SH3D_2_BLENDER')
+
+    return {'FINISHED'}
+
+  def loadStructure(self):
+    """Build the walls, floors and ceilings of every level from the structure OBJ.
+
+    The OBJ is read once and its faces classified by level and kind, then
+    the whole structure is scaled and flat shaded in one pass over the
+    arrays and every class becomes one object in the collection of its level.
+    """
+    arrays, materials, groups = readStructure(self.archive, self.plan.structure)
+    levels = self.levels
+    classes = classifyStructure(arrays, groups, [level.elevation - level.floorThickness for level in levels])
+
+    arrays['vertices'] *= scale
+    arrays['smooth'][:] = False
 
-    #read xml and files
-    xmlPath = os.path.join(self.xml_path,'Home.xml')
-    xmlRoot = ElementTree.parse(xmlPath).getroot()
+    levelCollections = {}
+    for (index, kind), faces in sorted(classes.items()):
+      collection = self.collections['structure']
+      name = kind
+      if len(levels) > 1:
+        collection = levelCollections.get(index)
+        if collection is None:
+          collection = bpy.data.collections.new(name=levels[index].name or 'Level %d' % index)
+          self.collections['structure'].children.link(collection)
+          levelCollections[index] = collection
+        name = '%s %s' % (collection.name, kind)
+
+      sub, slots = selectFaces(arrays, faces)
+      mesh = meshFromArrays(name, sub, [self.materials.material(materials[i]) for i in slots])
+      obj = bpy.data.objects.new(name, mesh)
+      collection.objects.link(obj)
+      if merge_static:
+        self.staticObjects.append((index, obj))
+
+  def removePreviousImport(self):
+    """Remove what a previous import created, the rest of the file is left alone.
+
+    Objects and collections go first, then the meshes, materials and images
+    they used once nothing else uses them, each kind in one batch_remove.
+    """
+    collections = self.findHome()
+    if collections is None:
+      return
+    home = collections['home']
+    colls = [home, collections['library']] + list(self.childCollections(home))
+    objs = set(home.all_objects) | set(collections['library'].objects)
+
+    meshes = set(obj.data for obj in objs if obj.type == 'MESH')
+    # templates no piece used anymore
+    meshes.update(mesh for mesh in bpy.data.meshes if 'sh3d_mesh' in mesh)
+    for obj in objs:
+      # LOD meshes are kept by a fake user
+      for name in obj.get('sh3d_lods', ()):
+        mesh = bpy.data.meshes.get(name)
+        if mesh is not None:
+          mesh.use_fake_user = False
+          meshes.add(mesh)
+    materials = self.slotMaterials(objs)
+    logger.info('+ removing previous import: %d objects', len(objs))
+
+    bpy.data.batch_remove(list(objs) + colls)
+    self.removeUnused(meshes, materials)
+
+  def slotMaterials(self, objs):
+    # object linked slots hide the model material of the mesh, removeUnused
+    # adds the mesh ones
+    return set(slot.material for obj in objs for slot in obj.material_slots if slot.material)
+
+  def removeUnused(self, meshes, materials):
+    """Remove the meshes, then the materials and images they used, once nothing uses them."""
+    meshes = [mesh for mesh in meshes if mesh.users == 0]
+    materials.update(material for mesh in meshes for material in mesh.materials if material)
+    images = set(node.image for material in materials if material.node_tree
+                 for node in material.node_tree.nodes if node.type == 'TEX_IMAGE' and node.image)
+    bpy.data.batch_remove(meshes)
+    for ids in (materials, images):
+      bpy.data.batch_remove([datablock for datablock in ids if datablock.users == 0])
+
+  def createCollections(self, context):
     #
     # Create collections
     #
@@ -170,7 +687,9 @@ class OpenFile(bpy.types.Operator):
     #  | Lights
     #  | ... groups
     #
-    for collec in self.collections.values() :
+    for key, collec in self.collections.items() :
+      # found again by a later sync import
+      collec['sh3d_collection'] = key
       if 'Home' in collec.name :
         context.scene.collection.children.link(collec)
       elif 'Library' in collec.name :
@@ -178,504 +697,528 @@ class OpenFile(bpy.types.Operator):
       else :
         self.collections['home'].children.link(collec)
 
-    #
-    # read house structure
-    #
-    filename=os.path.join(self.xml_path,xmlRoot.get('structure'))
-    bpy.ops.import_scene.obj(filepath=filename, use_split_objects=True)
-    obs = bpy.context.selected_editable_objects[:] 
-    # apply rotation
-    bpy.ops.object.transform_apply(location=True, rotation=True, scale=False)
-    
-    bpy.context.view_layer.objects.active=obs[0]
-    #bpy.ops.object.join()
-    for o in obs:
-      bpy.context.view_layer.objects.active=o
-      #o.name=xmlRoot.get('name')
-      o.dimensions=o.dimensions*scale
-      o.location=(0.0, 0.0, 0.0)
-      bpy.ops.object.shade_flat()
-      
-      # Remove structure from all collection
-      for coll in o.users_collection:
-        coll.objects.unlink(o)
-      # add structure to collections
-      self.collections['structure'].objects.link(o) # Home structure
-      #self.collections['home'].objects.link(o) # Home structure
+  def findHome(self):
+    """Collections of a previous import, None when there is none."""
+    collections = {}
+    for coll in bpy.data.collections:
+      if 'sh3d_collection' in coll:
+        collections[coll['sh3d_collection']] = coll
+    for key in ('home', 'structure', 'doorOrWindow', 'pieceOfFurniture', 'light', 'library'):
+      if key not in collections:
+        return None
+    return collections
 
-    Level = namedtuple("Level", "id elev ft")
-    levels=[]
+  def removeObjects(self, objs):
+    """Remove objects, and their meshes, materials and images when nothing else uses them.
 
-    self.LoadObjectTree(xmlRoot, self.collections['home'])
+    LOD meshes are kept by a fake user, released once no remaining object
+    lists them in its sh3d_lods.
+    """
+    meshes = set(obj.data for obj in objs if obj.type == 'MESH')
+    lods = set(name for obj in objs for name in obj.get('sh3d_lods', ()))
+    materials = self.slotMaterials(objs)
+    bpy.data.batch_remove(objs)
+    if lods:
+      lods -= set(name for obj in bpy.data.objects for name in obj.get('sh3d_lods', ()))
+      for name in lods:
+        mesh = bpy.data.meshes.get(name)
+        if mesh is not None:
+          mesh.use_fake_user = False
+          meshes.add(mesh)
+    self.removeUnused(meshes, materials)
 
-    obj = bpy.data.objects['Porte ouverte']
-    logger.debug("+ Porte ouverte location")   
-    logger.debug(obj.location)
+  def mergeStatic(self):
+    """Replace the structure and furniture objects of each level by one mesh.
 
-    logger.info('END SH3D_2_BLENDER')
+    Every distinct material (object slot overrides included) becomes one
+    slot of the merged mesh, so Blender draws one batch per material. Pieces
+    with LODs are merged at full resolution.
+    """
+    byLevel = {}
+    for index, obj in self.staticObjects:
+      byLevel.setdefault(index, []).append(obj)
 
-    return {'FINISHED'}
+    merged = bpy.data.collections.new(name="Merged")
+    merged['sh3d_collection'] = 'merged'
+    self.collections['home'].children.link(merged)
+    self.collections['home']['sh3d_merged'] = True
+
+    meshArrays = {}
+    for index, objs in sorted(byLevel.items()):
+      materials = []
+      slotOf = {}
+      parts = []
+      for obj in objs:
+        mesh = obj.data
+        if 'sh3d_lods' in obj:
+          mesh = bpy.data.meshes.get(obj['sh3d_lods'][0], mesh)
+        arrays = meshArrays.get(mesh.name)
+        if arrays is None:
+          arrays = meshArrays[mesh.name] = meshToArrays(mesh)
+        slots = []
+        for slot in obj.material_slots or [None]:
+          material = slot.material if slot is not None else None
+          key = material.name if material is not None else None
+          if key not in slotOf:
+            slotOf[key] = len(materials)
+            materials.append(material)
+          slots.append(slotOf[key])
+        parts.append((arrays, numpy.array(obj.matrix_world), slots))
+
+      name = self.levels[index].name if len(self.levels) > 1 else self.plan.name
+      name = name or 'Level %d' % index
+      logger.info('+ merging %d objects of <%s>', len(objs), name)
+      mesh = meshFromArrays(name, mergeArrays(parts), materials)
+      merged.objects.link(bpy.data.objects.new(name, mesh))
+
+    self.removeObjects([obj for index, obj in self.staticObjects])
+    self.staticObjects = []
+
+  def matchPieces(self):
+    """Pair the pieces of the plan with the objects of the previous import.
+
+    Objects whose model and materials did not change are kept in
+    self.previous and only moved if needed, the others are removed.
+    """
+    home = self.collections['home']
+    existing = {}
+    for obj in home.all_objects:
+      if 'sh3d_key' in obj:
+        existing.setdefault(obj['sh3d_key'], []).append(obj)
+
+    stale = []
+    for piece in self.plan.pieces():
+      objs = existing.get(piece.key)
+      if objs:
+        obj = objs.pop()
+        if obj['sh3d_shape'] == piece.shapeHash:
+          self.previous[piece] = obj
+        else:
+          stale.append(obj)
+    for objs in existing.values():
+      stale.extend(objs)
+    logger.info('+ %d pieces kept, %d removed', len(self.previous), len(stale))
+    self.removeObjects(stale)
+
+    for obj in self.collections['library'].objects:
+      if 'sh3d_model' in obj:
+        self.library.setdefault(obj['sh3d_model'], obj)
+    self.adoptTemplates()
+    for coll in self.childCollections(home):
+      if 'sh3d_group' in coll:
+        self.groups[coll['sh3d_group']] = coll
+
+  def groupCollection(self, group, parent):
+    """Collection of a furniture group, the one of the previous import if any."""
+    coll = self.groups.pop(group.key, None)
+    if coll is None:
+      coll = bpy.data.collections.new(name=group.name)
+      coll['sh3d_group'] = group.key
+      parent.children.link(coll)
+      return coll
+
+    coll.name = group.name
+    if coll.name not in parent.children:
+      for other in [self.collections['home']] + list(self.childCollections(self.collections['home'])):
+        if coll.name in other.children:
+          other.children.unlink(coll)
+      parent.children.link(coll)
+    return coll
+
+  def childCollections(self, collection):
+    for child in collection.children:
+      yield child
+      for grandchild in self.childCollections(child):
+        yield grandchild
+
+  def pieceCollection(self, piece, collection):
+    if 'Home' in collection.name :
+      return self.collections.get(piece.kind, self.collections['pieceOfFurniture'])
+    return collection
+
+  def tagObject(self, obj, piece):
+    """Record what a later sync import needs to compare the piece."""
+    obj['sh3d_key'] = piece.key
+    obj['sh3d_model'] = piece.model
+    obj['sh3d_hash'] = piece.hash
+    obj['sh3d_shape'] = piece.shapeHash
 
-  def LoadObjectTree(self, xmlRoot, collection):
+  def updatePiece(self, piece, obj, collection):
+    """Move a piece of the previous import whose model and materials did not change."""
+    self.progress += 1
+    target = self.pieceCollection(piece, collection)
+    if obj.name not in target.objects:
+      for coll in obj.users_collection:
+        if coll != self.collections['library']:
+          coll.objects.unlink(obj)
+      target.objects.link(obj)
 
-    obs = []
+    self.trace = self.debug and self.progress % log_sample == 0
+    if obj['sh3d_hash'] != piece.hash:
+      logger.info('+ moving object <%s> %d/%d', piece.name, self.progress, self.plan.pieceCount)
+      obj.name = piece.name
+      with self.profile.phase('place'):
+        self.placePiece(obj, piece)
+      self.tagObject(obj, piece)
+    self.staticPiece(piece, obj)
 
-    for element in xmlRoot:
-      objectType = element.tag
+  def staticPiece(self, piece, obj):
+    """Queue the object of a piece of furniture for mergeStatic."""
+    if merge_static and piece.kind == 'pieceOfFurniture':
+      self.staticObjects.append((self.levelIndex.get(piece.level and piece.level.id, 0), obj))
 
-      if objectType == 'level':
-         levels.append(Level(id=element.get('id'),elev=float(element.get('elevation')),ft=float(element.get('floorThickness'))))
+  def localBounds(self, mesh):
+    """(min, max) of a mesh's vertices, computed once per mesh."""
+    bounds = self.meshBounds.get(mesh.name)
+    if bounds is None:
+      bounds = self.meshBounds[mesh.name] = vertexBounds(meshVertices(mesh))
+    return bounds
+
+  def queueObjectTree(self, items, collection, queue):
+    """Create the collections of the furniture groups and queue (piece, collection) pairs."""
+    for item in items:
       #
       # furniture group     
       #
-      if objectType == 'furnitureGroup':
+      if isinstance(item, GroupPlan):
 
-        groupColl = bpy.data.collections.new(name=element.get('name'))
-        collection.children.link(groupColl)
+        groupColl = self.groupCollection(item, collection)
         # TODO: manage visibility
-        if 'visible' in element.keys() and False :
-          if element.get('visible') == 'false': 
-            groupColl.hide_viewport = True
+        if not item.visible and False :
+          groupColl.hide_viewport = True
 
-        # recursive call to load children    
-        self.LoadObjectTree(element, groupColl)
-         
-      
-      elif 'model' in element.keys():  
-       
-        filename=os.path.join(self.xml_path,unquote(element.get('model')))
-        filename = filename.replace('/', '\\')
-        dimX = float(element.get('width'))
-        dimZ = float(element.get('height'))
-        dimY = float(element.get('depth')) 
-        
-        locX = float(element.get('x'))*scale
-        locY = -float(element.get('y'))*scale
-        
-        lve=0.0
-        if 'level' in element.keys():
-          for lv in levels:
-            if lv.id == element.get('level'):
-              lve=(lv.elev)*scale
-
-        del obs[:]
-        # deselect all
-        bpy.ops.object.select_all(action='DESELECT')
-        #
-        # search for element in the collection
-        # if exist create a linked copy
-        # else load the object
-        name = element.get('name')
-        logger.info("+==============================================")
-        
-        logger.info('+ Importing <%s>', name)
-        isTemplate = False
+        # recursive call to queue children    
+        self.queueObjectTree(item.children, groupColl, queue)
 
-        if self.collections['library'].objects.find(name) != -1 :
-            obj = bpy.data.objects[name].copy()
-            obs.append(obj)
-            obs[0].location = (0, 0, 0)
-            
-            logger.info('+ instancing object <%s>', name)      
+      else:
+        queue.append((item, collection))
 
-        else:
+  def loadPiece(self, piece, collection):
+    """Place one piece of furniture of the plan in the scene."""
+    dimX = piece.width
+    dimZ = piece.height
+    dimY = piece.depth
 
-            logger.info('+ loading object <%s>', filename)
-            isTemplate = True
-            bpy.ops.import_scene.obj(filepath=filename)
-            obs = bpy.context.selected_editable_objects[:] 
-            obs[0].name=name
-        
-            bpy.context.view_layer.objects.active=obs[0]
-
-            bpy.ops.object.join()
-            bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY',center='BOUNDS')  
-            
-            logger.debug("+ location")   
-            logger.debug(obs[0].location)
-            
-            obs[0].location = (0, 0, 0)
-            
-            logger.debug("+ applying rotation") 
-            bpy.ops.object.transform_apply(location=True, rotation=True, scale=False)
-            logger.debug(obs[0].rotation_euler)
-
-        bpy.context.view_layer.objects.active=obs[0]
-
-        # Remove object from all collection
-        for coll in obs[0].users_collection:
-          coll.objects.unlink(obs[0])
-        #
-        # Link object to collection
-        #
-        if 'Home' in collection.name :
-          self.collections[objectType].objects.link(obs[0]) 
-        else :
-          collection.objects.link(obs[0])
-        # if object is not an instance add it to library
-        if isTemplate is True :
-          self.collections['library'].objects.link(obs[0])
-
-        # Set active object
-        obs[0].select_set(True)
-
-        bpy.context.view_layer.objects.active=obs[0]  
-        logger.debug("+ Active type")
-        logger.debug(type(bpy.context.view_layer.objects.active))
-
-        # 
-        # TODO: manage visibility
-        #
-        if 'visible' in element.keys() and False :
-          if element.get('visible') == 'false': 
-            obs[0].hide_viewport = True
-        #
-        # mirrored model
-        #
-        if 'modelMirrored' in element.keys() :
-          if element.get('modelMirrored') == 'true':
-
-            bpy.ops.transform.mirror(constraint_axis=(True, False, False),orient_type='GLOBAL', use_proportional_edit=False)
-        #
-        # rotated model
-        #
-        if 'modelRotation' in element.keys():
-          value=element.get('modelRotation')
-          va=value.split()
-          
-          mat_rot = mathutils.Matrix()
-
-          mat_rot[0][0]=float(va[0])
-          mat_rot[0][1]=float(va[1])
-          mat_rot[0][2]=float(va[2])
-          mat_rot[1][0]=float(va[3])
-          mat_rot[1][1]=float(va[4])
-          mat_rot[1][2]=float(va[5])
-          mat_rot[2][0]=float(va[6])
-          mat_rot[2][1]=float(va[7])
-          mat_rot[2][2]=float(va[8])
-
-          ob = bpy.context.object   
-          ob.matrix_world = mat_rot
-         
-          bpy.ops.object.transform_apply(location=False, rotation=True, scale=False)
-          
-          ob.rotation_euler=(math.pi/2,0.0,0.0)   
-        #  
-        # TODO: if 'backFaceShown' in element.keys():
-        #TODO    
-
-        #
-        # set dimmensions
-        #
-        obs[0].dimensions=(dimX*scale,dimY*scale,dimZ*scale)        
-
-        # reset delta center
-        delta_center = [0.0, 0.0, 0.0]
-        fixCenter = False
-        #
-        # angle
-        #
-        if 'angle' in element.keys():
-          angle = element.get('angle') 
-          obs[0].rotation_euler[2] = -float(angle)
-          fixCenter = True
-        else:   
-          obs[0].rotation_euler[2] = 0.0
-        #
-        # pitch
-        #
-        if 'pitch' in element.keys() :
-          pitch = element.get('pitch') 
-          obs[0].rotation_euler[0] = -float(pitch)
-          fixCenter = True
-        else:
-          obs[0].rotation_euler[0] = 0.0
-          height = dimZ * scale
-        #
-        # Compute correct height and new center with after angle and pitch rotation
-        #
-        if fixCenter :
-          logger.debug(obs[0].rotation_euler)
-          # update to get correct transform
-          bpy.context.view_layer.update()
-          logger.debug(obs[0].rotation_euler)
+    self.progress += 1
+    self.trace = self.debug and self.progress % log_sample == 0
+    logger.info('+ Importing <%s> %d/%d', piece.name, self.progress, self.plan.pieceCount)
+    #
+    # mirrored and rotated model, baked in a mesh shared by all the
+    # pieces with the same variant
+    #
+    obj = bpy.data.objects.new(piece.name, self.variantMesh(piece.model, piece.mirrored, piece.rotation))
+    isTemplate = piece.model not in self.library
+    if isTemplate :
+      self.library[piece.model] = obj
+    else :
+      logger.info('+ instancing object <%s> of <%s>', piece.name, piece.model)
+    #
+    # Link object to collection
+    #
+    self.pieceCollection(piece, collection).objects.link(obj)
+    # if object is not an instance add it to library
+    if isTemplate is True :
+      self.collections['library'].objects.link(obj)
+
+    # 
+    # TODO: manage visibility
+    #
+    if not piece.visible and False :
+      obj.hide_viewport = True
+    #  
+    # TODO: backFaceShown
+    #TODO    
+
+    with self.profile.phase('place'):
+      self.placePiece(obj, piece)
+    self.tagObject(obj, piece)
+    lods = self.variantLods(piece.model, piece.mirrored, piece.rotation) if lod_density else ()
+    if lods:
+      self.assignLod(obj, [obj.data] + lods)
+    self.staticPiece(piece, obj)
+
+    #
+    # color, collected per material slot
+    #
+    overrides = {}
+    if piece.color is not None:
+      for i in range(len(self.modelMaterials[piece.model])):
+        overrides[i] = {'color': piece.color}
+    #
+    # search for texture or materials
+    #
+    if piece.texture is not None and False:
+        image=piece.texture
+        for material in obj.data.materials:
+            img = self.textures.image(image)
+            tex = bpy.data.textures.new(image, type = 'IMAGE')
+            tex.image = img        
+            mtex = material.texture_slots.add()
+            mtex.texture = tex
+
+    for prop in piece.materials:
+        mname=prop.name
+        for i in self.materialSlots(piece.model, mname):
+          override = overrides.setdefault(i, {})
+          if prop.color is not None:
+            override['color'] = prop.color
+          #face texture of material
+          if prop.texture is not None:
+            override['texture'] = prop.texture
+          if prop.shininess is not None:
+            override['shininess'] = prop.shininess
+    #
+    # apply overrides with shared materials in object slots, the model
+    # materials are used by the other pieces
+    #
+    materials = self.modelMaterials[piece.model]
+    with self.profile.phase('materials'):
+      for i, override in overrides.items():
+        self.materials.assign(obj, i, self.materials.override(materials[i], **override))
           
-          # transform vertices to world space to compute correct height
-          #   a faire seulement si pitch != 0 sinon height = dimY/2*scale
-          wvertices = [obs[0].matrix_world @ mathutils.Vector(v.co) for v in obs[0].data.vertices]
-
-          # get bounds in world space
-          bounds = self.calcBounds(wvertices)
-          logger.debug("+ bounds:")
-          logger.debug(bounds)
-
-          # get height
-          zmin = bounds[5]
-          zmax = bounds[4]
-          height = zmax - zmin
-
-          logger.debug("+ dimX: " + str(dimX) + " dimY: " + str(dimY) + " dimZ: " + str(dimZ))
-          logger.debug("+ scale: " + str(scale))
-          logger.debug("+ height: " + str(height))
-
-          # compute delta center
-          delta_center = [
-            -bounds[0] - (bounds[1] - bounds[0]) / 2.0,
-            -bounds[2] - (bounds[3] - bounds[2]) / 2.0,
-            -bounds[4] - (bounds[5] - bounds[4]) / 2.0]
-          logger.debug(delta_center)
-
-        #
-        # adjust Z value
-        #
-        if 'elevation' in element.keys():
-          locZ= (height/2.0)+(float(element.get('elevation'))*scale)+lve 
-          logger.debug("+ elevation: " + element.get('elevation'))
-          logger.debug("+ lve: " + str(lve))
-          logger.debug("+ locZ: " + str(locZ))
-        else:    
-          locZ= (height/2.0)+lve
- 
-        #
-        # set location
-        #
-        logger.debug("+ location: " + str(locX) + " | " + str(locY) + " | " + str(locZ))
-
-        obs[0].location=(locX + delta_center[0], locY + delta_center[1], locZ + delta_center[2])
-
-        logger.debug(obs[0].location)
-        #
-        # color
-        #
-        if 'color' in element.keys():
-          color = element.get('color') 
-          r=int(color[2:4],16)/255.0
-          g=int(color[4:6],16)/255.0
-          b=int(color[6:8],16)/255.0
-          bcolor=[r,g,b,1.0]
-          for material in bpy.context.active_object.data.materials:
-            material.diffuse_color=bcolor
-        #
-        # search for texture or materials
-        #
-        for prop in element:
-          if prop.tag == 'texture' and False:
-              image=prop.get('image')
-              for material in bpy.context.active_object.data.materials:
-                  img = bpy.data.images.load(os.path.join(self.xml_path,image))
-                  tex = bpy.data.textures.new(image, type = 'IMAGE')
-                  tex.image = img        
-                  mtex = material.texture_slots.add()
-                  mtex.texture = tex
+    if piece.kind == 'light':   
+      owner=obj
+     
+      power=piece.power
+
+      # FIXME: Disabled for now
+      for light in piece.lightSources:
+        if False:       
+          bcolor=list(light.color)
+          lposx=(light.x-0.5)*dimX*scale*2.1
+          lposy=(light.y-0.5)*dimY*scale*2.1
+          lposz=(light.z-0.5)*dimZ*scale*2.1
               
-          if prop.tag == 'material':
-              mname=prop.get('name')
-              if 'color' in prop.keys():
-                color = prop.get('color') 
-                r=int(color[2:4],16)/255.0
-                g=int(color[4:6],16)/255.0
-                b=int(color[6:8],16)/255.0
-                bcolor=[r,g,b,0]
-
-                logger.debug("+ material:color: ")
-            
-                for material in obs[0].data.materials:
-                  if mname in material.name: 
-                    material.diffuse_color=bcolor
-        
-              #face texture of material
-              for texture in prop:
-                if texture.tag == 'texture' :  
-                  image=texture.get('image')
-                  for material in bpy.context.active_object.data.materials:
-                    if mname in material.name: 
-                      
-                      # if image not already loaded
-                      if image not in bpy.data.images :
-                        logger.debug("+ Image loading: " + image)
-                        img = bpy.data.images.load(os.path.join(self.xml_path,image))
-                      else :
-                        logger.debug("+ Image already loaded: " + image)
-                        img = bpy.data.images[image]
-
-                      material.use_nodes = True
-                      bsdf = material.node_tree.nodes["Principled BSDF"]
-                      #tex = bpy.data.textures.new(image, type = 'IMAGE')
-                      tex = material.node_tree.nodes.new('ShaderNodeTexImage')
-                      tex.image = img
-
-                      material.node_tree.links.new(bsdf.inputs['Base Color'], tex.outputs['Color'])
-                
-      
-      if objectType in ('light'):   
-        owner=bpy.context.active_object    
-       
-        power= float(element.get('power'))       
-  
-        # FIXME: Disabled for now
-        for light in element:
-          if light.tag == 'lightSource' and False:       
-            color=light.get('color')
-            r=int(color[2:4],16)/255.0
-            g=int(color[4:6],16)/255.0
-            b=int(color[6:8],16)/255.0
-            bcolor=[r,g,b]
-            lposx=(float(light.get('x'))-0.5)*dimX*scale*2.1
-            lposy=(float(light.get('y'))-0.5)*dimY*scale*2.1
-            lposz=(float(light.get('z'))-0.5)*dimZ*scale*2.1
-                
-            bpy.ops.object.lamp_add(type='POINT',location=(lposx, lposy, lposz))
-            bpy.context.active_object.data.energy=4000.0*power*scale
-            bpy.context.active_object.data.shadow_method='RAY_SHADOW'
-            bpy.context.active_object.data.color=bcolor
-            bpy.context.active_object.data.distance=10*scale
-            bpy.context.active_object.parent=owner
-            bpy.context.active_object.layers[3]= True
-            bpy.context.active_object.layers[0]= False
-            bpy.context.active_object.layers[1]= False
-            bpy.context.active_object.layers[2]= False
+          bpy.ops.object.lamp_add(type='POINT',location=(lposx, lposy, lposz))
+          bpy.context.active_object.data.energy=4000.0*power*scale
+          bpy.context.active_object.data.shadow_method='RAY_SHADOW'
+          bpy.context.active_object.data.color=bcolor
+          bpy.context.active_object.data.distance=10*scale
+          bpy.context.active_object.parent=owner
+          bpy.context.active_object.layers[3]= True
+          bpy.context.active_object.layers[0]= False
+          bpy.context.active_object.layers[1]= False
+          bpy.context.active_object.layers[2]= False
 
-        
-    #insert camera  
-     # FIXME: Disabled for now
-      if objectType in ('observerCamera') and False: 
-       if element.get('attribute') == 'observerCamera':
-        locX = float(element.get('x'))*scale
-        locY = -float(element.get('y'))*scale
-        locZ = float(element.get('z'))*scale
-        yaw = float(element.get('yaw'))
-        pitch = float(element.get('pitch'))
-        
-        
-        bpy.ops.object.camera_add(location=(locX, locY, locZ),rotation=((-pitch/8.0)+(-math.pi/2.0),math.pi,0))
-        bpy.ops.mesh.primitive_cube_add(location=(locX, locY, locZ-(170.0*scale/2.0)),rotation=(0.0,0.0,-yaw))
-        
-        obs = bpy.context.selected_editable_objects[:] 
-        #bpy.context.scene.objects.active=obs[0]
-        bpy.context.view_layer.objects.active=obs[0]
-        obs[0].name='player'
-        obs[0].dimensions=(40*scale,20*scale,170.0*scale)
-        
-        bpy.data.objects["Camera"].parent=bpy.data.objects["player"]
-        bpy.data.objects["Camera"].location=(0.0,-30.0*scale,22*scale)
-        
-        #bpy.data.objects["player"].game.physics_type='CHARACTER'
-        #bpy.data.objects["player"].game.use_collision_bounds=True
-        #bpy.data.objects["player"].game.step_height=0.8
-        
-        
-        #add logic blocks
-        obj=bpy.data.objects["player"]
-        cam=bpy.data.objects["Camera"]
-        
-        #foward
-        bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
-        bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
-        bpy.ops.logic.actuator_add(type="MOTION", object="player")
-        
-        obj.game.sensors[-1].link(obj.game.controllers[-1])
-        obj.game.actuators[-1].link(obj.game.controllers[-1])
-        
-        obj.game.sensors[-1].name="w"
-        obj.game.sensors[-1].key="W"
-        obj.game.actuators[-1].offset_location[1]=-speed
-        
-        #backward
-        bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
-        bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
-        bpy.ops.logic.actuator_add(type="MOTION", object="player")
-        
-        obj.game.sensors[-1].link(obj.game.controllers[-1])
-        obj.game.actuators[-1].link(obj.game.controllers[-1])
-        
-        obj.game.sensors[-1].name="s"
-        obj.game.sensors[-1].key="S"
-        obj.game.actuators[-1].offset_location[1]=speed
-        
-        #left
-        bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
-        bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
-        bpy.ops.logic.actuator_add(type="MOTION", object="player")
-        
-        obj.game.sensors[-1].link(obj.game.controllers[-1])
-        obj.game.actuators[-1].link(obj.game.controllers[-1])
-        
-        obj.game.sensors[-1].name="a"
-        obj.game.sensors[-1].key="A"
-        obj.game.actuators[-1].offset_location[0]=speed  
-        
-        #right
-        bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
-        bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
-        bpy.ops.logic.actuator_add(type="MOTION", object="player")
-        
-        obj.game.sensors[-1].link(obj.game.controllers[-1])
-        obj.game.actuators[-1].link(obj.game.controllers[-1])
-        
-        obj.game.sensors[-1].name="d"
-        obj.game.sensors[-1].key="D"
-        obj.game.actuators[-1].offset_location[0]=-speed        
-        
-        #jump
-        bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
-        bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
-        bpy.ops.logic.actuator_add(type="MOTION", object="player")
-        
-        obj.game.sensors[-1].link(obj.game.controllers[-1])
-        obj.game.actuators[-1].link(obj.game.controllers[-1])
-        
-        obj.game.sensors[-1].name="space"
-        obj.game.sensors[-1].key="SPACE"
-        obj.game.actuators[-1].mode='OBJECT_CHARACTER'
-        obj.game.actuators[-1].use_character_jump=True
-        
-        #mouse view
-        bpy.ops.logic.sensor_add(type="MOUSE", object="player")
-        bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
-        bpy.ops.logic.actuator_add(type="MOUSE", object="player")
-      
-        
-        obj.game.sensors[-1].link(obj.game.controllers[-1])
-        obj.game.actuators[-1].link(obj.game.controllers[-1])
-        
-        obj.game.sensors[-1].mouse_event='MOVEMENT'
-        
-        obj.game.actuators[-1].mode='LOOK'
-        obj.game.actuators[-1].sensitivity_y=0.0
-        
-        
-        
-        bpy.ops.logic.actuator_add(type="MOUSE", object="Camera")
-        cam.game.actuators[-1].link(obj.game.controllers[-1]) 
-        
-        cam.game.actuators[-1].mode='LOOK'
-        cam.game.actuators[-1].sensitivity_x=0.0
-        
+  def placePiece(self, obj, piece):
+    """Set the scale, rotation and location of a piece's object."""
+    dimX = piece.width
+    dimZ = piece.height
+    dimY = piece.depth
     
-    #world settings
-    if False:
-        bpy.data.worlds["World"].light_settings.use_ambient_occlusion=True
-        bpy.data.worlds["World"].light_settings.ao_factor=0.01
-        bpy.data.worlds["World"].light_settings.use_environment_light=True
-        bpy.data.worlds["World"].light_settings.environment_energy=0.01
-        
-        bpy.data.scenes["Scene"].unit_settings.system='METRIC'
-        bpy.data.scenes["Scene"].unit_settings.scale_length=0.01/scale
-        bpy.data.scenes["Scene"].layers[0]=True
-        bpy.data.scenes["Scene"].layers[1]=True
-        bpy.data.scenes["Scene"].layers[2]=True
-        bpy.data.scenes["Scene"].layers[3]=True
-        
-    return {'FINISHED'}
+    locX = piece.x*scale
+    locY = -piece.y*scale
+    
+    lve=0.0
+    if piece.level is not None:
+      lve=(piece.level.elevation)*scale
+
+    #
+    # set dimmensions
+    #
+    mesh = obj.data
+    if 'sh3d_lods' in obj:
+      # a moved piece may show a LOD, whose clustered vertices shrink the bounds
+      mesh = bpy.data.meshes.get(obj['sh3d_lods'][0], mesh)
+    low, high = self.localBounds(mesh)
+    extents = high - low
+    objScale = [d*scale/e if e > 0.0 else 1.0 for d, e in zip((dimX, dimY, dimZ), extents)]
+    obj.scale = objScale
+
+    # reset delta center
+    delta_center = [0.0, 0.0, 0.0]
+    fixCenter = False
+    #
+    # angle
+    #
+    if piece.angle is not None:
+      obj.rotation_euler[2] = -piece.angle
+      fixCenter = True
+    else:   
+      obj.rotation_euler[2] = 0.0
+    #
+    # pitch
+    #
+    if piece.pitch is not None:
+      obj.rotation_euler[0] = -piece.pitch
+      fixCenter = True
+    else:
+      obj.rotation_euler[0] = 0.0
+      height = dimZ * scale
+    #
+    # Compute correct height and new center with after angle and pitch rotation
+    #
+    if fixCenter :
+      # transform the corners of the cached local bounds with the scale
+      # and rotation of the object to compute correct height, the matrix
+      # is built from the piece so no depsgraph update is needed
+      matrix = placementMatrix(objScale, piece.angle, piece.pitch)
+      corners = transformVertices(boxCorners(low, high), matrix)
 
+      # get bounds in world space
+      bounds = self.calcBounds(corners.reshape(-1, 3))
 
+      # get height
+      zmin = bounds[5]
+      zmax = bounds[4]
+      height = zmax - zmin
+
+      # compute delta center
+      delta_center = [
+        -bounds[0] - (bounds[1] - bounds[0]) / 2.0,
+        -bounds[2] - (bounds[3] - bounds[2]) / 2.0,
+        -bounds[4] - (bounds[5] - bounds[4]) / 2.0]
+      if self.trace:
+        logger.debug('+ <%s> rotation: %s bounds: %s height: %s delta center: %s',
+                     piece.name, tuple(obj.rotation_euler), bounds, height, delta_center)
+
+    #
+    # adjust Z value
+    #
+    locZ= (height/2.0)+(piece.elevation*scale)+lve 
  
+    #
+    # set location
+    #
+    obj.location=(locX + delta_center[0], locY + delta_center[1], locZ + delta_center[2])
+
+    if self.trace:
+      logger.debug('+ <%s> dim: %s %s %s elevation: %s level: %s location: %s',
+                   piece.name, dimX, dimY, dimZ, piece.elevation, lve, tuple(obj.location))
+
+  def loadCamera(self, camera):
+    """Insert the observer camera with FPS game logic blocks (blender 2.7x)."""
+    locX = camera.x*scale
+    locY = -camera.y*scale
+    locZ = camera.z*scale
+    yaw = camera.yaw
+    pitch = camera.pitch
+
+
+    bpy.ops.object.camera_add(location=(locX, locY, locZ),rotation=((-pitch/8.0)+(-math.pi/2.0),math.pi,0))
+    bpy.ops.mesh.primitive_cube_add(location=(locX, locY, locZ-(170.0*scale/2.0)),rotation=(0.0,0.0,-yaw))
+
+    obs = bpy.context.selected_editable_objects[:] 
+    #bpy.context.scene.objects.active=obs[0]
+    bpy.context.view_layer.objects.active=obs[0]
+    obs[0].name='player'
+    obs[0].dimensions=(40*scale,20*scale,170.0*scale)
+
+    bpy.data.objects["Camera"].parent=bpy.data.objects["player"]
+    bpy.data.objects["Camera"].location=(0.0,-30.0*scale,22*scale)
+
+    #bpy.data.objects["player"].game.physics_type='CHARACTER'
+    #bpy.data.objects["player"].game.use_collision_bounds=True
+    #bpy.data.objects["player"].game.step_height=0.8
+
+
+    #add logic blocks
+    obj=bpy.data.objects["player"]
+    cam=bpy.data.objects["Camera"]
+
+    #foward
+    bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
+    bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
+    bpy.ops.logic.actuator_add(type="MOTION", object="player")
+
+    obj.game.sensors[-1].link(obj.game.controllers[-1])
+    obj.game.actuators[-1].link(obj.game.controllers[-1])
+
+    obj.game.sensors[-1].name="w"
+    obj.game.sensors[-1].key="W"
+    obj.game.actuators[-1].offset_location[1]=-speed
+
+    #backward
+    bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
+    bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
+    bpy.ops.logic.actuator_add(type="MOTION", object="player")
+
+    obj.game.sensors[-1].link(obj.game.controllers[-1])
+    obj.game.actuators[-1].link(obj.game.controllers[-1])
+
+    obj.game.sensors[-1].name="s"
+    obj.game.sensors[-1].key="S"
+    obj.game.actuators[-1].offset_location[1]=speed
+
+    #left
+    bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
+    bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
+    bpy.ops.logic.actuator_add(type="MOTION", object="player")
+
+    obj.game.sensors[-1].link(obj.game.controllers[-1])
+    obj.game.actuators[-1].link(obj.game.controllers[-1])
+
+    obj.game.sensors[-1].name="a"
+    obj.game.sensors[-1].key="A"
+    obj.game.actuators[-1].offset_location[0]=speed  
+
+    #right
+    bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
+    bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
+    bpy.ops.logic.actuator_add(type="MOTION", object="player")
+
+    obj.game.sensors[-1].link(obj.game.controllers[-1])
+    obj.game.actuators[-1].link(obj.game.controllers[-1])
+
+    obj.game.sensors[-1].name="d"
+    obj.game.sensors[-1].key="D"
+    obj.game.actuators[-1].offset_location[0]=-speed        
+
+    #jump
+    bpy.ops.logic.sensor_add(type="KEYBOARD", object="player")
+    bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
+    bpy.ops.logic.actuator_add(type="MOTION", object="player")
+
+    obj.game.sensors[-1].link(obj.game.controllers[-1])
+    obj.game.actuators[-1].link(obj.game.controllers[-1])
+
+    obj.game.sensors[-1].name="space"
+    obj.game.sensors[-1].key="SPACE"
+    obj.game.actuators[-1].mode='OBJECT_CHARACTER'
+    obj.game.actuators[-1].use_character_jump=True
+
+    #mouse view
+    bpy.ops.logic.sensor_add(type="MOUSE", object="player")
+    bpy.ops.logic.controller_add(type="LOGIC_AND", object="player")
+    bpy.ops.logic.actuator_add(type="MOUSE", object="player")
+
+
+    obj.game.sensors[-1].link(obj.game.controllers[-1])
+    obj.game.actuators[-1].link(obj.game.controllers[-1])
+
+    obj.game.sensors[-1].mouse_event='MOVEMENT'
+
+    obj.game.actuators[-1].mode='LOOK'
+    obj.game.actuators[-1].sensitivity_y=0.0
+
+
+
+    bpy.ops.logic.actuator_add(type="MOUSE", object="Camera")
+    cam.game.actuators[-1].link(obj.game.controllers[-1]) 
+
+    cam.game.actuators[-1].mode='LOOK'
+    cam.game.actuators[-1].sensitivity_x=0.0
+
   def invoke(self, context, event):
       context.window_manager.fileselect_add(self)
       return {'RUNNING_MODAL'}
  
  
-bpy.utils.register_class(OpenFile)
+def setLod(level, objects=None):
+  """Switch imported pieces to one of their LOD meshes, 0 for full resolution.
+
+  For instance setLod(0) before a final render, setLod(1) for the viewport.
+  """
+  for obj in bpy.data.objects if objects is None else objects:
+    lods = obj.get('sh3d_lods')
+    if lods:
+      mesh = bpy.data.meshes.get(lods[min(level, len(lods) - 1)])
+      if mesh is not None:
+        obj.data = mesh
+
+
+if __name__ == '__main__':
+  # run from the Text Editor, sh3d_batch.py imports this file as a module
+  bpy.utils.register_class(OpenFile)
  
-bpy.ops.object.openfile('INVOKE_DEFAULT')
+  bpy.ops.object.openfile('INVOKE_DEFAULT')
@@ -0,0 +1,156 @@
+#  ########################################################################
+#
+#   Tests of the SweetHome3D to Blender geometry helpers
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Run with: python -m pytest tests
+
+import os
+import sys
+
+import numpy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sh3d_geom import (variantMatrix, transformVertices, transformNormals, flipsWinding,
+                       reversedLoops, vertexBounds, boxCorners, placementMatrix, decimateArrays)
+
+# a box from (0, 0, 0) to (2, 4, 6) in Blender axes
+box = numpy.array([0, 0, 0, 2, 4, 6], dtype=numpy.float32)
+
+
+def test_variant_matrix_centers_the_box():
+  matrix = variantMatrix(box)
+  assert transformVertices(box, matrix).tolist() == [-1, -2, -3, 1, 2, 3]
+
+
+def test_variant_matrix_conjugates_model_rotation():
+  # quarter turn around the Y (up) axis of the model, in row major order
+  rotation = '0 0 1 0 1 0 -1 0 0'
+  matrix = variantMatrix(box, rotation=rotation)
+  # Y up is Z up in Blender: the turn is around Z, mapping x to y
+  rotated = transformVertices(numpy.array([1, 0, 0, 0, 0, 1], dtype=numpy.float32), matrix)
+  centered = rotated.reshape(-1, 3) - matrix[:3, 3]
+  assert numpy.allclose(centered, [[0, 1, 0], [0, 0, 1]])
+  assert not flipsWinding(matrix)
+
+
+def test_variant_matrix_mirror_flips_width():
+  matrix = variantMatrix(box, mirrored=True)
+  assert numpy.allclose(matrix[:3, :3], numpy.diag([-1, 1, 1]))
+  assert transformVertices(box, matrix).tolist() == [1, -2, -3, -1, 2, 3]
+  assert flipsWinding(matrix)
+
+
+def test_reversed_loops_keep_the_first_corner():
+  order = reversedLoops(numpy.array([0, 3]), numpy.array([3, 4]))
+  assert order.tolist() == [0, 2, 1, 3, 6, 5, 4]
+
+
+def test_transform_normals_through_mirror():
+  matrix = variantMatrix(box, mirrored=True)
+  normals = transformNormals(numpy.array([1, 0, 0, 0, 0, 1], dtype=numpy.float32), matrix)
+  assert numpy.allclose(normals.reshape(-1, 3), [[-1, 0, 0], [0, 0, 1]])
+
+
+def test_vertex_bounds():
+  low, high = vertexBounds(numpy.array([1, -2, 3, -1, 5, 0], dtype=numpy.float32))
+  assert low.tolist() == [-1, -2, 0]
+  assert high.tolist() == [1, 5, 3]
+
+
+def test_vertex_bounds_of_nothing():
+  low, high = vertexBounds(numpy.empty(0, dtype=numpy.float32))
+  assert low.tolist() == high.tolist() == [0, 0, 0]
+
+
+def test_box_corners():
+  corners = boxCorners((0, 0, 0), (1, 2, 3)).reshape(-1, 3)
+  assert len(corners) == 8
+  assert sorted(map(tuple, corners.tolist())) == [(x, y, z) for x in (0, 1) for y in (0, 2) for z in (0, 3)]
+  low, high = vertexBounds(corners.ravel())
+  assert low.tolist() == [0, 0, 0] and high.tolist() == [1, 2, 3]
+
+
+def eulerMatrix(x, y, z):
+  """Rotation matrix of a Blender XYZ euler, Rz @ Ry @ Rx."""
+  cx, sx, cy, sy, cz, sz = numpy.cos(x), numpy.sin(x), numpy.cos(y), numpy.sin(y), numpy.cos(z), numpy.sin(z)
+  return numpy.array([
+    [cy*cz, sx*sy*cz - cx*sz, cx*sy*cz + sx*sz],
+    [cy*sz, sx*sy*sz + cx*cz, cx*sy*sz - sx*cz],
+    [-sy, sx*cy, cx*cy],
+    ])
+
+
+def test_placement_matrix_matches_euler():
+  scale, angle, pitch = (0.5, 2.0, 3.0), 0.7, -0.3
+  matrix = placementMatrix(scale, angle, pitch)
+  assert numpy.allclose(matrix[:3, :3], eulerMatrix(-pitch, 0.0, -angle) @ numpy.diag(scale))
+  assert matrix[:3, 3].tolist() == [0, 0, 0]
+
+
+def test_placement_matrix_turns_clockwise():
+  # SweetHome3D angles turn clockwise seen from above
+  matrix = placementMatrix((2.0, 1.0, 1.0), numpy.pi / 2)
+  assert numpy.allclose(matrix[:3, :3] @ [1, 0, 0], [0, -2, 0])
+  assert numpy.allclose(placementMatrix((1.0, 2.0, 3.0))[:3, :3], numpy.diag([1, 2, 3]))
+
+
+def gridArrays(n):
+  """A flat n x n grid of quads with one uv per corner, 2 materials."""
+  x, y = numpy.meshgrid(numpy.arange(n + 1), numpy.arange(n + 1), indexing='ij')
+  vertices = numpy.stack([x.ravel(), y.ravel(), numpy.sin(x.ravel() + y.ravel())], axis=1)
+  i, j = numpy.meshgrid(numpy.arange(n), numpy.arange(n), indexing='ij')
+  first = (i * (n + 1) + j).ravel()
+  quads = numpy.stack([first, first + n + 1, first + n + 2, first + 1], axis=1)
+  faces = len(quads)
+  return {
+    'vertices': vertices.astype(numpy.float32).ravel(),
+    'loops': quads.astype(numpy.int32).ravel(),
+    'loop_starts': numpy.arange(faces, dtype=numpy.int32) * 4,
+    'loop_totals': numpy.full(faces, 4, dtype=numpy.int32),
+    'material_indices': (numpy.arange(faces) % 2).astype(numpy.int32),
+    'smooth': numpy.ones(faces, dtype=bool),
+    'uvs': numpy.zeros(faces * 8, dtype=numpy.float32),
+    }
+
+
+def test_decimate_to_target():
+  arrays = gridArrays(40)
+  for target in (2000, 500, 60):
+    lod = decimateArrays(arrays, target)
+    count = len(lod['loop_starts'])
+    assert 0 < count <= target
+    assert len(lod['loops']) == 3 * count
+    assert len(lod['uvs']) == 6 * count
+    assert len(lod['material_indices']) == len(lod['smooth']) == count
+    assert lod['loops'].max() < len(lod['vertices']) // 3
+    assert set(lod['material_indices'].tolist()) == {0, 1}
+
+
+def test_decimate_below_the_coarsest_grid():
+  # two cells per axis leave 52 triangles, one cell none: never return nothing
+  lod = decimateArrays(gridArrays(40), 12)
+  assert len(lod['loop_starts']) > 0
+  low, high = vertexBounds(lod['vertices'])
+  assert (high - low)[:2].min() > 0
@@ -0,0 +1,104 @@
+#  ########################################################################
+#
+#   Tests of the SweetHome3D OBJ reader
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Run with: python -m pytest tests
+
+import os
+import sys
+
+import numpy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sh3d_obj import parseObj, cornerIndices
+
+square = b'v 0 0 0\nv 1 0 0\nv 1 1 0\nv 0 1 0\nvt 0 0\nvt 1 0\nvt 1 1\nvt 0 1\n'
+
+
+def test_same_format_faces():
+  arrays = parseObj(square + b'f 1/1 2/2 3/3\nf 1/1 3/3 4/4\n')[0]
+  assert arrays['loops'].tolist() == [0, 1, 2, 0, 2, 3]
+  assert arrays['uvs'].reshape(-1, 2).tolist() == [[0, 0], [1, 0], [1, 1], [0, 0], [1, 1], [0, 1]]
+
+
+def test_mixed_formats_with_fast_path_slash_count():
+  # 6 slashes for 6 corners, but 0 and 2 per corner
+  arrays = parseObj(square + b'f 1 2 3\nf 1/1/1 3/2/1 4/3/1\n')[0]
+  assert arrays['loops'].tolist() == [0, 1, 2, 0, 2, 3]
+  assert arrays['uvs'].reshape(-1, 2).tolist() == [[0, 0], [0, 0], [0, 0], [0, 0], [1, 0], [1, 1]]
+
+
+def test_mixed_formats():
+  arrays = parseObj(square + b'f 1//1 2//1 3//1\nf 1/1 3/3 4/4\n')[0]
+  assert arrays['loops'].tolist() == [0, 1, 2, 0, 2, 3]
+  assert arrays['uvs'].reshape(-1, 2)[3:].tolist() == [[0, 0], [1, 1], [0, 1]]
+
+
+def test_corner_indices_without_uvs():
+  vindex, tindex, nindex = cornerIndices([b'1//2', b'2//2', b'3//2'])
+  assert vindex.tolist() == [1, 2, 3]
+  assert tindex.tolist() == [0, 0, 0]
+  assert nindex.tolist() == [2, 2, 2]
+
+
+def test_corner_indices_without_normals():
+  vindex, tindex, nindex = cornerIndices([b'1/1', b'2/2', b'3/3'])
+  assert tindex.tolist() == [1, 2, 3]
+  assert nindex is None
+
+
+def test_negative_indices():
+  data = b'v 0 0 0\nv 1 0 0\nv 1 1 0\nvt 0 0\nvt 1 0\nvt 1 1\nf -3/-3 -2/-2 -1/-1\n'
+  data += b'v 0 1 0\nvt 0 1\nf 1/1 -2/-2 -1/-1\n'
+  arrays = parseObj(data)[0]
+  assert arrays['loops'].tolist() == [0, 1, 2, 0, 2, 3]
+  assert arrays['uvs'].reshape(-1, 2).tolist() == [[0, 0], [1, 0], [1, 1], [0, 0], [1, 1], [0, 1]]
+
+
+def test_texture_coordinates_with_w():
+  data = b'v 0 0 0\nv 1 0 0\nv 1 1 0\nvt 0 0 0\nvt 1 0 0\nvt 0.5 1 0\nf 1/1 2/2 3/3\n'
+  arrays = parseObj(data)[0]
+  assert arrays['uvs'].dtype == numpy.float32
+  assert arrays['uvs'].reshape(-1, 2).tolist() == [[0, 0], [1, 0], [0.5, 1]]
+
+
+def test_vertices_with_colors():
+  data = b'v 0 0 0 1 0 0\nv 1 0 0 0 1 0\nv 1 1 0\nf 1 2 3\n'
+  arrays = parseObj(data)[0]
+  assert arrays['vertices'].tolist() == [0, 0, 0, 1, 0, 0, 1, 1, 0]
+
+
+def test_normals_make_faces_smooth():
+  data = square + b'vn 0 0 1\nvn 0 1 0\ns off\nf 1/1/1 2/2/1 3/3/2\nf 1/1 3/3 4/4\n'
+  arrays = parseObj(data)[0]
+  assert arrays['smooth'].tolist() == [True, False]
+  assert arrays['normals'].reshape(-1, 3).tolist() == [[0, 0, 1], [0, 0, 1], [0, 1, 0],
+                                                      [0, 0, 0], [0, 0, 0], [0, 0, 0]]
+
+
+def test_no_normals():
+  arrays = parseObj(square + b's 1\nf 1 2 3\n')[0]
+  assert arrays['smooth'].tolist() == [True]
+  assert len(arrays['normals']) == 0
@@ -0,0 +1,73 @@
+#  ########################################################################
+#
+#   Tests of the SweetHome3D import plan
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Run with: python -m pytest tests
+
+import os
+import sys
+from xml.etree import ElementTree
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sh3d_plan import HomePlan
+
+home = '''<home name="test">
+  <level id="l0" name="Ground" elevation="0" height="250"/>
+  <level id="l1" name="First" elevation="%s" height="250"/>
+  <pieceOfFurniture id="p0" level="l1" name="Chair" model="models/chair.obj" x="%s" y="100"
+                    width="40" depth="40" height="90" color="%s"/>
+  <furnitureGroup name="Set">
+    <pieceOfFurniture name="Table" model="models/table.obj" x="0" y="0" width="80" depth="80" height="70"/>
+  </furnitureGroup>
+</home>'''
+
+
+def piece(elevation='250', x='100', color='FF808080'):
+  plan = HomePlan(ElementTree.fromstring(home % (elevation, x, color)))
+  return list(plan.pieces())[0]
+
+
+def test_moving_keeps_the_shape():
+  chair, moved = piece(), piece(x='150')
+  assert chair.hash != moved.hash
+  assert chair.shapeHash == moved.shapeHash
+  assert chair.key == moved.key == 'p0'
+
+
+def test_level_elevation_changes_the_hash_only():
+  chair, raised = piece(), piece(elevation='300')
+  assert chair.hash != raised.hash
+  assert chair.shapeHash == raised.shapeHash
+
+
+def test_color_changes_the_shape():
+  assert piece().shapeHash != piece(color='FFFF0000').shapeHash
+
+
+def test_pieces_without_id_are_keyed_by_hash():
+  plan = HomePlan(ElementTree.fromstring(home % ('250', '100', 'FF808080')))
+  table = list(plan.pieces())[1]
+  assert table.key == 'hash:' + table.hash
+  assert plan.models == {'models/chair.obj': 1, 'models/table.obj': 1}
@@ -0,0 +1,92 @@
+#  ########################################################################
+#
+#   Tests of the SweetHome3D structure classification
+#
+#  ########################################################################
+#
+#   Copyright (c) : 2018  Luis Claudio Gambôa Lopes
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2, or (at your option)
+#   any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program; if not, write to the Free Software
+#   Foundation, Inc., 675 Mass Ave, Cambridge, MA 02139, USA.
+#
+#   For e-mail suggestions :  lcgamboa@yahoo.com
+#  ######################################################################## */
+
+# Run with: python -m pytest tests
+
+import os
+import sys
+
+import numpy
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sh3d_structure import classifyStructure, groupKind
+
+
+def wall(z0, z1):
+  return [(0, 0, z0), (100, 0, z0), (100, 0, z1), (0, 0, z1)]
+
+
+def floor(z):
+  return [(0, 0, z), (100, 0, z), (100, 100, z), (0, 100, z)]
+
+
+def ceiling(z):
+  return floor(z)[::-1]
+
+
+def structureArrays(faces):
+  """Mesh arrays of (corners, group) quads, in Blender axes."""
+  vertices = [corner for corners, group in faces for corner in corners]
+  return {
+    'vertices': numpy.array(vertices, dtype=numpy.float32).ravel(),
+    'loops': numpy.arange(len(vertices), dtype=numpy.int32),
+    'loop_starts': numpy.arange(len(faces), dtype=numpy.int32) * 4,
+    'loop_totals': numpy.full(len(faces), 4, dtype=numpy.int32),
+    'face_groups': numpy.array([group for corners, group in faces], dtype=numpy.int32),
+    }
+
+
+def test_group_kinds():
+  assert groupKind('wall_3') == 'Walls'
+  assert groupKind('Room_1') == 'Rooms'
+  assert groupKind('ground') == 'Ground'
+  assert groupKind('polyline_2') is None
+
+
+def test_classify_by_name_normal_and_level():
+  names = ['wall_0', 'room_0', 'wall_1', 'other']
+  arrays = structureArrays([
+    (wall(0, 250), 0),
+    (floor(0), 1),
+    (ceiling(250), 1),
+    (wall(300, 550), 2),
+    (floor(300), 3),
+    (wall(300, 550), 3),
+    ])
+  classes = classifyStructure(arrays, names, (-10, 290))
+  assert dict((key, faces.tolist()) for key, faces in classes.items()) == {
+    (0, 'Walls'): [0],
+    (0, 'Floors'): [1],
+    (0, 'Ceilings'): [2],
+    (1, 'Walls'): [3, 5],
+    (1, 'Floors'): [4],
+    }
+
+
+def test_classify_without_levels():
+  arrays = structureArrays([(wall(300, 550), 0), (floor(0), 1)])
+  classes = classifyStructure(arrays, ['wall_0', 'ground'])
+  assert sorted(classes) == [(0, 'Ground'), (0, 'Walls')]